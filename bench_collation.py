@@ -0,0 +1,119 @@
+""" Benchmark title comparisons and lookups.
+
+Compares the rate of rich comparisons between movies as they used to be
+(BaselineMovie, a copy of the old Movie's comparisons: __lt__ on the titles,
+plus the total_ordering wrapper for >), which is what the trees called at
+every level, with the rate of direct comparisons between precomputed sort
+keys, which is what they do now. Then times lookups in full libraries.
+
+Usage: python bench_collation.py [number of titles]
+"""
+
+import random
+import sys
+import time
+from functools import total_ordering
+
+from movieLib import MovieLib, Movie, COLLATIONS
+
+
+@total_ordering
+class BaselineMovie:
+    """ A movie that compares as Movie did before collation keys. """
+
+    def __init__(self, i_title):
+        """ Initialise a BaselineMovie Object. """
+        self._title = i_title
+
+    def __eq__(self, other):
+        """ Return True if this movie has exactly same title as other. """
+        if (other._title == self._title):
+            return True
+        return False
+
+    def __lt__(self, other):
+        """ Return True if this movie is ordered before other. """
+        if other._title > self._title:
+            return True
+        return False
+
+
+def _titles(count, seed=1):
+    """ Return count distinct random titles sharing common prefixes. """
+    rng = random.Random(seed)
+    prefixes = ['The ', 'Star Wars: ', 'A ', 'Le ', 'Amélie ', '']
+    words = ['Night', 'Return', 'Empire', 'Éclair', 'love', 'War', 'Day']
+    titles = set()
+    while len(titles) < count:
+        titles.add(rng.choice(prefixes)
+                   + ' '.join(rng.choice(words) for i in range(3))
+                   + ' ' + str(rng.randrange(count)))
+    return list(titles)
+
+
+def _rate(count, seconds):
+    """ Return count / seconds formatted as a rate. """
+    return '{:>12,.0f}/s'.format(count / seconds)
+
+
+def _time_pairs(pairs, rounds):
+    """ Return the seconds taken to compare each pair with < and >. """
+    start = time.perf_counter()
+    for i in range(rounds):
+        for a, b in pairs:
+            a < b
+            a > b
+    return time.perf_counter() - start
+
+
+def bench_comparisons(titles, collation, rounds=5):
+    """ Print comparisons per second, old rich versus raw sort keys.
+
+    The old Movie only had exact comparisons, so under any other collation
+    the rich comparisons timed are the current Movie's.
+    """
+    if collation == 'exact':
+        movies = [BaselineMovie(title) for title in titles]
+        label = 'baseline Movie'
+    else:
+        movies = [Movie(title, collation=collation) for title in titles]
+        label = 'Movie'
+    pairs = list(zip(movies, movies[1:] + movies[:1]))
+    count = len(pairs) * rounds
+    rich = _time_pairs(pairs, rounds)
+
+    keys = [COLLATIONS[collation](title) for title in titles]
+    keypairs = list(zip(keys, keys[1:] + keys[:1]))
+    raw = _time_pairs(keypairs, rounds)
+
+    print(collation, 'comparisons:', label, _rate(2 * count, rich),
+          '  sort keys', _rate(2 * count, raw),
+          '  ({:.1f}x)'.format(rich / raw))
+
+
+def bench_lookups(titles, engine, collation):
+    """ Print lookups per second in a library of titles. """
+    library = MovieLib(engine, collation)
+    for title in titles:
+        library.add(title, '01/01/2000', 90)
+    queries = titles[:]
+    random.Random(2).shuffle(queries)
+    start = time.perf_counter()
+    for title in queries:
+        library.search(title)
+    elapsed = time.perf_counter() - start
+    print(engine, collation, 'lookups:', _rate(len(queries), elapsed))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    titles = _titles(count)
+    for collation in COLLATIONS:
+        bench_comparisons(titles, collation)
+    for engine in ('bst', 'btree'):
+        for collation in COLLATIONS:
+            bench_lookups(titles, engine, collation)
+
+
+if __name__ == '__main__':
+    main()
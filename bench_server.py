@@ -0,0 +1,99 @@
+""" Load generator for movieServer.
+
+Starts a MovieServer on a Unix socket over a library of random titles (or
+connects to a running server), then runs concurrent clients that each
+pipeline requests over their own connection, and reports throughput and
+latency percentiles. A share of the lookups go to a few hot titles, which
+the server coalesces.
+
+Usage: python bench_server.py [--titles N] [--clients N] [--depth N]
+                              [--requests N] [--hot FRACTION] [--unix PATH]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from bench_collation import _titles
+from movieLib import MovieLib
+from movieServer import MovieServer, connect
+
+
+async def _client(path, titles, hot, requests, depth, hot_share, latencies,
+                  seed):
+    """ (Private) Make requests, depth at a time, recording latencies. """
+    client = await connect(path)
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(depth)
+
+    async def one():
+        try:
+            if rng.random() < hot_share:
+                title = rng.choice(hot)
+            else:
+                title = rng.choice(titles)
+            start = time.perf_counter()
+            await client.search(title)
+            latencies.append(time.perf_counter() - start)
+        finally:
+            slots.release()
+
+    tasks = []
+    for i in range(requests):
+        await slots.acquire()
+        tasks.append(asyncio.ensure_future(one()))
+    await asyncio.gather(*tasks)
+    await client.close()
+
+
+def _percentile(ordered, fraction):
+    """ (Private) Return the given percentile of a sorted list. """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args):
+    titles = _titles(args.titles)
+    server = None
+    path = args.unix
+    if path is None:
+        library = MovieLib()
+        for title in titles:
+            library.add(title, '01/01/2000', 90)
+        path = os.path.join(tempfile.mkdtemp(), 'movies.sock')
+        server = MovieServer(library)
+        await server.start(path)
+    hot = titles[:10]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(path, titles, hot, args.requests // args.clients, args.depth,
+                args.hot, latencies, seed)
+        for seed in range(args.clients)])
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        await server.close()
+    latencies.sort()
+    print(len(latencies), 'requests from', args.clients, 'clients,',
+          args.depth, 'in flight each')
+    print('throughput: {:,.0f} requests/s'.format(len(latencies) / elapsed))
+    print('latency: p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms'.format(
+        1000 * _percentile(latencies, 0.50), 1000 * _percentile(latencies, 0.99),
+        1000 * latencies[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark movieServer.')
+    parser.add_argument('--titles', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--hot', type=float, default=0.2)
+    parser.add_argument('--unix', help='socket of a running server to use')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
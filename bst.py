@@ -1,5 +1,7 @@
 from functools import total_ordering
 
+from validate import check_tree
+
 @total_ordering
 class TestClass:
     """ Represents an arbitrary thing, for testing the BST. """
@@ -41,38 +43,72 @@ class TestClass:
 
 
 
+def sort_key(item):
+    """ Return the key that item is ordered by in a tree.
+
+    Items that provide a sort_key() method (such as Movie) are ordered by the
+    key it returns, which the tree compares directly; anything else is
+    ordered by comparing the items themselves.
+    """
+    get_key = getattr(item, 'sort_key', None)
+    if get_key is not None:
+        return get_key()
+    return item
+
+
+def build_balanced(items):
+    """ Return the root of a balanced BST holding items, or None if empty.
+
+    Args:
+        items - a list of objects, already in order and without duplicates
+    """
+    def build(low, high, parent):
+        if low >= high:
+            return None
+        mid = (low + high) // 2
+        node = BSTNode(items[mid])
+        node._parent = parent
+        node._leftchild = build(low, mid, node)
+        node._rightchild = build(mid + 1, high, node)
+        return node
+    return build(0, len(items), None)
+
+
 class BSTNode:
     """ An internal node for a Binary Search Tree.  """
     
     def __init__(self, item):
         """ Initialise a BSTNode on creation, with value==item. """
         self._element = item
+        self._key = sort_key(item)
         self._leftchild = None
         self._rightchild = None
         self._parent = None
+        self._dead = False
 
     def __str__(self):
         """ Return a string representation of the tree rooted at this node.
 
         The string will be created by an in-order traversal.
         """
-        # method body goes here
-
-        if self:
-            if self._leftchild or self._rightchild:
-                string = ''
-                if self._leftchild:
-                    string += self._leftchild.__str__() + ''
+        return ''.join(str(element) + ' ' for element in self.inorder())
 
-                string += str(self._element) +' '
+    def inorder(self):
+        """ Generate the elements of the tree rooted here, in order.
 
-                if self._rightchild:
-                    string += self._rightchild.__str__() + ''
-                return string
+        Tombstoned (logically removed) elements are skipped.
+        """
+        stack = []
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node._leftchild
             else:
-                return str(self._element) + ' '
-        else:
-            return None
+                node = stack.pop()
+                if not node._dead:
+                    yield node._element
+                node = node._rightchild
 
 
     def _stats(self):
@@ -81,6 +117,30 @@ class BSTNode:
                + '; height = ' + str(self.height()))
     
   
+    def inorder_from(self, key):
+        """ Generate the elements with sort keys at or after key, in order.
+
+        Tombstoned (logically removed) elements are skipped.
+        """
+        # stack up the nodes at or after key on the way down, leaving out
+        # the subtrees wholly before it
+        stack = []
+        node = self
+        while node is not None:
+            if node._key < key:
+                node = node._rightchild
+            else:
+                stack.append(node)
+                node = node._leftchild
+        while stack:
+            node = stack.pop()
+            if not node._dead:
+                yield node._element
+            node = node._rightchild
+            while node is not None:
+                stack.append(node)
+                node = node._leftchild
+
     def search(self, searchitem):
         """ Return object matching searchitem, or None.
 
@@ -88,74 +148,75 @@ class BSTNode:
             searchitem: an object of any class stored in the BST
 
         """
-        #return object - movie
-        #call search node
-        # method body goes here
-
-        self.search_node(searchitem)
+        node = self.search_node(searchitem)
+        if node is not None and not node._dead:
+            return node._element
+        return None
 
 
     def search_node(self, searchitem):
         """ Return the BSTNode (with subtree) containing searchitem, or None. 
 
+        The node returned may be a tombstone (see mark_removed).
+
         Args:
             searchitem: an object of any class stored in the BST
         """
-
-        # return node
-        # most work
-        # method body goes here
-
-        if self == None:
-            return None
-
-        elif searchitem < self._element:
-            if self._leftchild is None:
-                return None
-            return self._leftchild.search_node(searchitem)
-
-        elif searchitem > self._element:
-            if self._rightchild is None:
-                return None
-            return self._rightchild.search_node(searchitem)
-
-        elif searchitem is self._element:
-            return self
-
-        else:
-            return None
+        # walk down comparing the precomputed sort keys, rather than calling
+        # the elements' rich comparison methods at every level
+        key = sort_key(searchitem)
+        node = self
+        while node is not None:
+            if key < node._key:
+                node = node._leftchild
+            elif node._key < key:
+                node = node._rightchild
+            else:
+                return node
+        return None
 
     def add(self, obj):
         """ Add item to the tree, maintaining BST properties.
 
         Returns the item added, or None if a matching object was already there.
+        A tombstone matching obj is brought back to life holding obj.
         """
-        # method body goes here
+        return self.insert(obj)[0]
 
-        #go left
-        if obj < self._element:
-            if self._leftchild is None:
-                new_node = BSTNode(obj)
-                new_node._parent = self
-                self._leftchild = new_node
-                return obj
-            else:
-                return self._leftchild.add(obj)
-
-        #go right
-        elif obj > self._element:
-            if self._rightchild is None:
-                new_node = BSTNode(obj)
-                new_node._parent = self
-                self._rightchild = new_node
-                return obj
-            else:
-                return self._rightchild.add(obj)
+    def insert(self, obj):
+        """ Add item to the tree as add does, in a single walk down it.
 
-        #if equal
-        else:
-            #obj == self._element
-            return None
+        Returns a pair: the item added (or None, as add returns), and True if
+        it was added by bringing back a tombstone rather than as a new node.
+        """
+        key = sort_key(obj)
+        node = self
+        while True:
+            #go left
+            if key < node._key:
+                if node._leftchild is None:
+                    new_node = BSTNode(obj)
+                    new_node._parent = node
+                    node._leftchild = new_node
+                    return (obj, False)
+                node = node._leftchild
+
+            #go right
+            elif node._key < key:
+                if node._rightchild is None:
+                    new_node = BSTNode(obj)
+                    new_node._parent = node
+                    node._rightchild = new_node
+                    return (obj, False)
+                node = node._rightchild
+
+            #if equal
+            else:
+                if node._dead:
+                    node._element = obj
+                    node._dead = False
+                    return (obj, True)
+                return (None, False)
 
 
     def findmaxnode(self):
@@ -185,28 +246,21 @@ class BSTNode:
         """ Return the size of this subtree.
 
         The size is the number of nodes (or elements) in the tree, 
-        including this node.
+        including this node. Tombstones are not counted.
         """
-        # method body goes here
-
         if self is None:
             return 0
-        elif self._leftchild and self._rightchild is not None:
-            return 1 + self._leftchild.size() + self._rightchild.size()
-        elif self._leftchild is not None:
-            return 1 + self._leftchild.size()
-        elif self._rightchild is not None:
-            return 1 + self._rightchild.size()
-        else:
-            return 1
+        count = 0 if self._dead else 1
+        if self._leftchild is not None:
+            count += self._leftchild.size()
+        if self._rightchild is not None:
+            count += self._rightchild.size()
+        return count
 
 
     def leaf(self):
         """ Return True if this node has no children. """
-        # method body goes here
-        # no children
-
-        if self._leftchild and self._rightchild is None:
+        if self._leftchild is None and self._rightchild is None:
             return True
         else:
             return False
@@ -252,74 +306,122 @@ class BSTNode:
         Remove the matching object from the tree rooted at this node.
         Maintains the BST properties.
         """
-        # call remove node, find the node first
-        # method body goes here
         node = self.search_node(searchitem)
-        if node is not None:
-            node.remove_node()
-            #print(node._element)
-            
+        if node is not None and not node._dead:
+            return node.remove_node()
+        return None
+
+    def mark_removed(self, searchitem):
+        """ Tombstone the object matching searchitem, and return it, if there.
+
+        The node stays in the tree, so nothing is relinked, but searches and
+        traversals skip it from now on. Use build_balanced to rebuild the
+        tree without its tombstones.
+
+        Args:
+            searchitem - an object of any class stored in the BST
+        """
+        node = self.search_node(searchitem)
+        if node is None or node._dead:
+            return None
+        node._dead = True
+        return node._element
+
     def remove_node(self):
         """ Remove this BSTNode from its tree, and return its element.
         Maintains the BST properties.
+
+        The root has no parent to relink, so when it is removed the contents
+        of a child are pulled up into it instead. A root with no children
+        cannot be removed from the tree; the caller has to discard it.
         """
-        #work
         #if this is a full node
             #find the biggest item in the left tree
             #  - there must be a left tree, since this is a full node
             #  - the node for that item can have no right children
             #move that item up into this item
-            #remove that old node, which is now a semileaf
-            #return the original element
-        #else if this has no children
-            #find who the parent was
-            #set the parent's appropriate child to None
-            #wipe this node
-            #return this node's element
-        #else if this has no right child (but must have a left child)
-            #shift leftchild up into its place, and clean up
+            #remove that old node, which is now a semileaf or leaf
             #return the original element
-        #else this has no left child (but must have a right child)
-            #shift rightchild up into its place, and clean up
+        #else this has at most one child
+            #shift that child (if any) up into its place, and clean up
             #return the original element
 
-        # method body goes here
-
-        if self._leftchild and self._rightchild is not None:
+        element = self._element
+        if self._leftchild is not None and self._rightchild is not None:
             biggest = self._leftchild.findmaxnode()
-            biggest._leftchild = self._leftchild
-            biggest._rightchild = self._rightchild
-            biggest._parent = self._parent
-            self._parent = None
-            self._rightchild = None
-            self._leftchild = None
-            return self._element
-        elif self._leftchild and self._rightchild is None:
-            if self._parent._leftchild is self:
-                self._parent._leftchild = None
-                self._parent = None
-            elif self._parent._rightchild is self:
-                self._parent._rightchild = None
-                self._parent = None
-            return self._element
-        elif self._leftchild is not None and self._rightchild is None:
-            self._parent._rightchild = self._leftchild
-            self._leftchild._parent = self._parent
-            self._parent = None
-            self._leftchild = None
-            return self._element
-        elif self._rightchild is not None and self._leftchild is None:
-            self._parent._leftchild = self._rightchild
-            self._rightchild._parent = self._parent
-            self._parent = None
-            self._rightchild = None
-            return self._element
+            self._element = biggest._element
+            self._key = biggest._key
+            self._dead = biggest._dead
+            biggest._unlink()
+        else:
+            self._unlink()
+        return element
+
+    def _unlink(self):
+        """ (Private) Remove this node, which has at most one child. """
+        if self._leftchild is not None:
+            child = self._leftchild
+        else:
+            child = self._rightchild
+        if self._parent is None:
+            if child is not None:
+                self._element = child._element
+                self._key = child._key
+                self._dead = child._dead
+                self._leftchild = child._leftchild
+                self._rightchild = child._rightchild
+                if self._leftchild is not None:
+                    self._leftchild._parent = self
+                if self._rightchild is not None:
+                    self._rightchild._parent = self
+                child._parent = None
+                child._leftchild = None
+                child._rightchild = None
+            return
+        if child is not None:
+            child._parent = self._parent
+        if self._parent._leftchild is self:
+            self._parent._leftchild = child
+        else:
+            self._parent._rightchild = child
+        self._parent = None
+        self._leftchild = None
+        self._rightchild = None
 
     def _print_structure(self):
-        """ (Private) Print a structured representation of tree at this node. """
-        if self._isthisapropertree() == False:
+        """ (Private) Print a structured representation of tree at this node.
+
+        The tree is checked, and every height found, once up front, rather
+        than again at every node.
+        """
+        report = check_tree(self)
+        if not report.ok():
             print("ERROR: this is not a proper Binary Search Tree. ++++++++++")
-        outstr = str(self._element) + ' (hgt=' + str(self.height()) + ')['
+            print(report)
+        heights = {}
+        self._heights(heights)
+        self._print_nodes(heights)
+
+    def _heights(self, heights):
+        """ (Private) Record the height of each node here, by id, in heights.
+
+        Returns the height of this node.
+        """
+        left = -1
+        right = -1
+        if self._leftchild is not None:
+            left = self._leftchild._heights(heights)
+        if self._rightchild is not None:
+            right = self._rightchild._heights(heights)
+        heights[id(self)] = 1 + max(left, right)
+        return heights[id(self)]
+
+    def _print_nodes(self, heights):
+        """ (Private) Print this node and those below it, one per line. """
+        outstr = str(self._element)
+        if self._dead:
+            outstr = outstr + ' (removed)'
+        outstr = outstr + ' (hgt=' + str(heights[id(self)]) + ')['
         if self._leftchild is not None:
             outstr = outstr + "left: " + str(self._leftchild._element)
         else:
@@ -334,65 +436,18 @@ class BSTNode:
             outstr = outstr + ' -- parent: *'
         print(outstr)
         if self._leftchild is not None:
-            self._leftchild._print_structure()
+            self._leftchild._print_nodes(heights)
         if self._rightchild is not None:
-            self._rightchild._print_structure()
+            self._rightchild._print_nodes(heights)
 
     def _properBST(self):
         """ Return True if this is the root of a proper BST; False otherwise. 
 
-        First checks that this is a proper tree (i.e. parent and child
-        references all link up properly.
-
-        Then checks that it obeys the BST property.
+        Checks that this is a proper tree (i.e. parent and child
+        references all link up properly) and that it obeys the BST property,
+        in a single pass (see validate.check_tree).
         """
-        if not self._isthisapropertree():
-            return False
-        return self._BSTproperties()[0]
-
-    def _BSTproperties(self):
-        """ Return a tuple describing state of this node as root of a BST.
-
-        Returns:
-            (boolean, minvalue, maxvalue):
-                boolean is True if it is a BST, and false otherwise
-                minvalue is the lowest value in this subtree
-                maxvalue is the highest value in this subtree
-        """
-        minvalue = self._element
-        maxvalue = self._element
-        if self._leftchild is not None:
-            leftstate = self._leftchild._BSTproperties()
-            if not leftstate[0] or leftstate[2] > self._element:
-                return (False,None,None)
-            minvalue = leftstate[1]
-
-        if self._rightchild is not None:
-            rightstate = self._rightchild._BSTproperties()
-            if not rightstate[0] or rightstate[1] < self._element:
-                return (False,None,None)
-            maxvalue = rightstate[2]
-
-        return (True, minvalue,maxvalue)
-
-    def _isthisapropertree(self):
-        """ Return True if this node is a properly implemented tree. """
-        ok = True
-        if self._leftchild is not None:
-            if self._leftchild._parent != self:
-                ok = False
-            if self._leftchild._isthisapropertree() == False:
-                ok = False
-        if self._rightchild is not None:
-            if self._rightchild._parent != self:
-                ok = False
-            if self._rightchild._isthisapropertree() == False:
-                ok = False          
-        if self._parent is not None:
-            if (self._parent._leftchild != self
-                and self._parent._rightchild != self):
-                ok = False
-        return ok
+        return check_tree(self).ok()
 
     def _testadd():
         node = BSTNode(TestClass("Memento", "11/10/2000"))
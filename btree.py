@@ -0,0 +1,675 @@
+import os
+import pickle
+import struct
+from bisect import bisect_left
+from collections import OrderedDict
+
+from bst import sort_key
+
+DEFAULT_ORDER = 48
+DEFAULT_PAGE_SIZE = 4096
+DEFAULT_CACHE_PAGES = 1024
+
+
+class BTreeNode:
+    """ A node of a B-tree.
+
+    Holds a sorted array of sort keys, the items they belong to, and, for
+    internal nodes, one more child reference than it has items. Leaves have
+    no children.
+    """
+
+    __slots__ = ('_keys', '_items', '_children', '_ref', '_overflow')
+
+    def __init__(self, keys=None, items=None, children=None):
+        """ Initialise a BTreeNode with the given keys, items and children. """
+        self._keys = keys if keys is not None else []
+        self._items = items if items is not None else []
+        self._children = children if children is not None else []
+        self._ref = None
+        # the overflow pages holding the rest of the node, in a page file
+        self._overflow = []
+
+    def leaf(self):
+        """ Return True if this node has no children. """
+        return not self._children
+
+
+class _MemoryStore:
+    """ (Private) Keeps B-tree nodes as ordinary Python objects.
+
+    A node's reference is the node itself, so loading is free.
+    """
+
+    def __init__(self, order):
+        """ Initialise an empty store for a tree of the given order. """
+        self.order = order
+        self.size = 0
+        self.root = self.new()
+
+    def new(self, keys=None, items=None, children=None):
+        """ Return a new node. """
+        return BTreeNode(keys, items, children)
+
+    def ref(self, node):
+        """ Return the reference under which node is stored. """
+        return node
+
+    def load(self, ref):
+        """ Return the node stored under ref. """
+        return ref
+
+    def save(self, node):
+        """ Record that node has been modified. """
+
+    def free(self, node):
+        """ Release the storage held by node. """
+
+    def trim(self):
+        """ Write back anything an operation has left pending. """
+
+    def flush(self):
+        """ Write out any pending changes. """
+
+    def close(self):
+        """ Release the store. """
+
+
+class PageStore:
+    """ Keeps B-tree nodes in fixed-size pages of a file.
+
+    Page 0 holds the tree header. Each node is pickled into a page of its
+    own, prefixed by its length and the number of its first overflow page.
+    The few nodes too big for one page (those holding very long titles, say)
+    run on into a chain of overflow pages, each prefixed by the number of
+    the next. Freed pages are chained together into a free list and reused.
+
+    The header records whether the file is clean. flush() (and so close())
+    writes every page and then a header marked clean. The first page write
+    after that marks the header open before anything else is written, so a
+    file whose writes were cut short (and so may hold pages that do not
+    match its header) is refused when it is next opened. Opening a file,
+    and reading it, write nothing.
+
+    About cache_pages decoded nodes are kept in memory. While an operation
+    is under way only unmodified nodes are evicted, so that nothing is
+    written to the file while the tree is half changed. Modified nodes, and
+    freed pages, are written when the operation is over (trim()) and on
+    flush(); a node stays cached and modified until its write succeeds.
+
+    The default order and page size are chosen so that a full node of
+    typical movies just fits a page, keeping pages well filled; any order
+    works with any page size, at the cost of overflow pages.
+    """
+
+    _MAGIC = b'PYFLIXBT'
+    _VERSION = 4
+    _HEADER = struct.Struct('<8sIIII16sqqqq')
+    _CLEAN = 0
+    _OPEN = 1
+    # the length of a node and its first overflow page, or for a free page
+    # 0 and the next free page
+    _PAGE = struct.Struct('<Iq')
+    # the next overflow page
+    _NEXT = struct.Struct('<q')
+    _MIN_PAGE_SIZE = 128
+
+    def __init__(self, filename, order, page_size=DEFAULT_PAGE_SIZE,
+                 cache_pages=DEFAULT_CACHE_PAGES, collation=None):
+        """ Open (or create) the page file filename.
+
+        If the file already holds a tree, the order and page size recorded
+        in it are used in place of the arguments. Its collation must match,
+        since the sort keys in its pages were made under it.
+        """
+        if cache_pages < 8:
+            raise ValueError('cache_pages must be at least 8')
+        self._cache = OrderedDict()
+        self._dirty = set()
+        # freed pages whose free list link is still to be written
+        self._freed = {}
+        self._capacity = cache_pages
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self._file = open(filename, 'r+b')
+            try:
+                self._read_header()
+                if self.collation != collation:
+                    raise ValueError('B-tree page file was made with '
+                                     + 'collation ' + repr(self.collation)
+                                     + ', not ' + repr(collation))
+            except BaseException:
+                self._file.close()
+                raise
+        else:
+            if page_size < self._MIN_PAGE_SIZE:
+                raise ValueError('page_size must be at least '
+                                 + str(self._MIN_PAGE_SIZE))
+            self._file = open(filename, 'w+b')
+            try:
+                self.page_size = page_size
+                self.order = order
+                if collation and len(collation.encode('utf8')) > 16:
+                    raise ValueError('collation name is too long')
+                self.collation = collation
+                self.size = 0
+                self._free = -1
+                self._npages = 1
+                self._state = self._CLEAN
+                self.root = self.ref(self.new())
+                self.flush()
+            except BaseException:
+                self._file.close()
+                raise
+
+    def _read_header(self):
+        """ (Private) Load the tree header from page 0. """
+        self._file.seek(0)
+        raw = self._file.read(self._HEADER.size)
+        if len(raw) < self._HEADER.size:
+            raise ValueError('not a B-tree page file')
+        (magic, version, self.page_size, self.order, self._state, collation,
+         self.root, self.size, self._free,
+         self._npages) = self._HEADER.unpack(raw)
+        if magic != self._MAGIC:
+            raise ValueError('not a B-tree page file')
+        if version != self._VERSION:
+            raise ValueError('unsupported B-tree page file version '
+                             + str(version))
+        if self._state != self._CLEAN:
+            raise ValueError('B-tree page file was not flushed or closed '
+                             + 'cleanly; its last writes may be incomplete')
+        collation = collation.rstrip(b'\0').decode('utf8')
+        self.collation = collation if collation else None
+
+    def _write_header(self):
+        """ (Private) Store the tree header in page 0. """
+        self._file.seek(0)
+        self._file.write(self._HEADER.pack(
+            self._MAGIC, self._VERSION, self.page_size, self.order,
+            self._state, (self.collation or '').encode('utf8'), self.root,
+            self.size, self._free, self._npages))
+
+    def _begin_write(self):
+        """ (Private) Mark the header open, before the first page write since
+        the file was last clean.
+        """
+        if self._state != self._OPEN:
+            self._state = self._OPEN
+            self._write_header()
+            self._file.flush()
+
+    def _write_page(self, page, data):
+        """ (Private) Write data, padded to a whole page, into page. """
+        self._begin_write()
+        self._file.seek(page * self.page_size)
+        self._file.write(data.ljust(self.page_size, b'\0'))
+
+    def _read_page(self, page):
+        """ (Private) Return the contents of page. """
+        self._file.seek(page * self.page_size)
+        return self._file.read(self.page_size)
+
+    def _write_node(self, node):
+        """ (Private) Write node to its page, and any overflow pages. """
+        payload = pickle.dumps((node._keys, node._items, node._children),
+                               pickle.HIGHEST_PROTOCOL)
+        first = self.page_size - self._PAGE.size
+        rest = self.page_size - self._NEXT.size
+        chunks = [payload[:first]]
+        for start in range(first, len(payload), rest):
+            chunks.append(payload[start:start + rest])
+        overflow = node._overflow
+        while len(overflow) < len(chunks) - 1:
+            overflow.append(self._allocate())
+        while len(overflow) > len(chunks) - 1:
+            self._release(overflow.pop())
+        links = overflow + [-1]
+        self._write_page(node._ref, self._PAGE.pack(len(payload), links[0])
+                         + chunks[0])
+        for i, page in enumerate(overflow):
+            self._write_page(page, self._NEXT.pack(links[i + 1])
+                             + chunks[i + 1])
+
+    def _read_node(self, page):
+        """ (Private) Return the node stored from page on. """
+        data = self._read_page(page)
+        length, link = self._PAGE.unpack_from(data)
+        parts = [data[self._PAGE.size:self._PAGE.size + length]]
+        remaining = length - len(parts[0])
+        overflow = []
+        while link != -1:
+            overflow.append(link)
+            data = self._read_page(link)
+            link = self._NEXT.unpack_from(data)[0]
+            parts.append(data[self._NEXT.size:self._NEXT.size + remaining])
+            remaining -= len(parts[-1])
+        keys, items, children = pickle.loads(b''.join(parts))
+        node = BTreeNode(keys, items, children)
+        node._ref = page
+        node._overflow = overflow
+        return node
+
+    def _cache_node(self, node):
+        """ (Private) Put node in the cache, evicting old unmodified nodes. """
+        self._cache[node._ref] = node
+        self._cache.move_to_end(node._ref)
+        excess = len(self._cache) - self._capacity
+        if excess > 0:
+            clean = []
+            for page in self._cache:
+                if page not in self._dirty:
+                    clean.append(page)
+                    if len(clean) == excess:
+                        break
+            for page in clean:
+                del self._cache[page]
+
+    def _allocate(self):
+        """ (Private) Return an unused page, from the free list if it can. """
+        page = self._free
+        if page == -1:
+            self._npages += 1
+            return self._npages - 1
+        if page in self._freed:
+            self._free = self._freed.pop(page)
+        else:
+            self._free = self._PAGE.unpack_from(self._read_page(page))[1]
+        return page
+
+    def _release(self, page):
+        """ (Private) Put page on the free list. """
+        self._freed[page] = self._free
+        self._free = page
+
+    def new(self, keys=None, items=None, children=None):
+        """ Return a new node, allocated a page of its own. """
+        node = BTreeNode(keys, items, children)
+        node._ref = self._allocate()
+        self.save(node)
+        return node
+
+    def ref(self, node):
+        """ Return the page number under which node is stored. """
+        return node._ref
+
+    def load(self, page):
+        """ Return the node stored in page. """
+        node = self._cache.get(page)
+        if node is not None:
+            self._cache.move_to_end(page)
+            return node
+        node = self._read_node(page)
+        self._cache_node(node)
+        return node
+
+    def save(self, node):
+        """ Record that node has been modified. """
+        self._dirty.add(node._ref)
+        self._cache_node(node)
+
+    def free(self, node):
+        """ Return the pages held by node to the free list. """
+        self._cache.pop(node._ref, None)
+        self._dirty.discard(node._ref)
+        self._release(node._ref)
+        while node._overflow:
+            self._release(node._overflow.pop())
+
+    def _write_freed(self):
+        """ (Private) Write the free list links of freed pages. """
+        if self._freed:
+            self._begin_write()
+        for page in sorted(self._freed):
+            self._write_page(page, self._PAGE.pack(0, self._freed[page]))
+            del self._freed[page]
+
+    def trim(self):
+        """ Write back and evict the oldest nodes while over capacity.
+
+        Called once an operation is over and the tree is consistent again.
+        """
+        while len(self._cache) > self._capacity:
+            page, old = next(iter(self._cache.items()))
+            if page in self._dirty:
+                self._write_node(old)
+                self._dirty.discard(page)
+            del self._cache[page]
+        # after the nodes, whose writes may free overflow pages
+        self._write_freed()
+
+    def flush(self):
+        """ Write every modified node, and then a clean header, to the file.
+        """
+        for page in sorted(self._dirty):
+            self._write_node(self._cache[page])
+            self._dirty.discard(page)
+        self._write_freed()
+        self._file.flush()
+        self._state = self._CLEAN
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        """ Flush and close the page file. """
+        if not self._file.closed:
+            try:
+                self.flush()
+            finally:
+                self._file.close()
+
+
+class BTree:
+    """ A B-tree of ordered items.
+
+    Each node holds up to order - 1 items, with their sort keys (see
+    bst.sort_key) in a sorted array that is searched with bisect, so a
+    lookup touches only about log(n)/log(order) nodes. Nodes normally live
+    in memory; if pagefile is given they live in fixed-size pages of that
+    file behind a bounded page cache instead, so trees larger than memory
+    stay usable.
+    """
+
+    def __init__(self, order=DEFAULT_ORDER, pagefile=None,
+                 page_size=DEFAULT_PAGE_SIZE, cache_pages=DEFAULT_CACHE_PAGES,
+                 collation=None):
+        """ Initialise a BTree.
+
+        Args:
+            order - the maximum number of children of a node (at least 3)
+            pagefile - the name of a file to keep the nodes in, or None
+            page_size - the size in bytes of each page of pagefile
+            cache_pages - the number of pages to keep cached in memory
+            collation - the name of the collation the items' sort keys are
+                made under (see movieLib.COLLATIONS), or None; it is
+                recorded in pagefile, which cannot then be reopened under
+                another
+        """
+        if order < 3:
+            raise ValueError('order must be at least 3')
+        if pagefile is None:
+            self._store = _MemoryStore(order)
+        else:
+            self._store = PageStore(pagefile, order, page_size, cache_pages,
+                                    collation)
+        self._order = self._store.order
+        self._minitems = (self._order + 1) // 2 - 1
+
+    def __str__(self):
+        """ Return a string representation of the tree.
+
+        The string will be created by an in-order traversal.
+        """
+        return ''.join(str(item) + ' ' for item in self.inorder())
+
+    def __iter__(self):
+        """ Iterate over the items of the tree in order. """
+        return self.inorder()
+
+    def _stats(self):
+        """ Return the basic stats on the tree. """
+        return ('size = ' + str(self.size())
+               + '; height = ' + str(self.height()))
+
+    def inorder(self):
+        """ Generate the items of the tree in order. """
+        return self._inorder(self._store.load(self._store.root))
+
+    def inorder_from(self, key):
+        """ Generate the items with sort keys at or after key, in order. """
+        load = self._store.load
+        # each entry is (node, index of the next item of node to generate)
+        stack = []
+        node = load(self._store.root)
+        while True:
+            i = bisect_left(node._keys, key)
+            stack.append((node, i))
+            if not node._children:
+                break
+            node = load(node._children[i])
+        while stack:
+            node, i = stack.pop()
+            if i >= len(node._items):
+                continue
+            stack.append((node, i + 1))
+            yield node._items[i]
+            if node._children:
+                child = load(node._children[i + 1])
+                while True:
+                    stack.append((child, 0))
+                    if not child._children:
+                        break
+                    child = load(child._children[0])
+
+    def _inorder(self, node):
+        """ (Private) Generate the items at or below node in order. """
+        if node.leaf():
+            yield from node._items
+            return
+        load = self._store.load
+        children = list(node._children)
+        items = list(node._items)
+        for i, item in enumerate(items):
+            yield from self._inorder(load(children[i]))
+            yield item
+        yield from self._inorder(load(children[-1]))
+
+    def size(self):
+        """ Return the number of items in the tree. """
+        return self._store.size
+
+    def height(self):
+        """ Return the height of the tree, or -1 if it is empty.
+
+        A tree consisting of a single (leaf) root has height 0.
+        """
+        if self._store.size == 0:
+            return -1
+        load = self._store.load
+        node = load(self._store.root)
+        height = 0
+        while node._children:
+            node = load(node._children[0])
+            height += 1
+        return height
+
+    def search(self, searchitem):
+        """ Return the item matching searchitem, or None.
+
+        Args:
+            searchitem: an object of any class stored in the tree
+        """
+        key = sort_key(searchitem)
+        load = self._store.load
+        node = load(self._store.root)
+        while True:
+            keys = node._keys
+            i = bisect_left(keys, key)
+            if i < len(keys) and not key < keys[i]:
+                return node._items[i]
+            if not node._children:
+                return None
+            node = load(node._children[i])
+
+    def _find(self, searchitem):
+        """ (Private) Locate searchitem in the tree.
+
+        Returns:
+            (key, node, index, found, path):
+                key is the sort key of searchitem
+                node is the node where the search stopped
+                index is the position of searchitem in that node's items
+                found is True if searchitem is at that position
+                path is the list of (ancestor, child index) pairs above node
+        """
+        key = sort_key(searchitem)
+        load = self._store.load
+        node = load(self._store.root)
+        path = []
+        while True:
+            keys = node._keys
+            i = bisect_left(keys, key)
+            if i < len(keys) and not key < keys[i]:
+                return (key, node, i, True, path)
+            if not node._children:
+                return (key, node, i, False, path)
+            path.append((node, i))
+            node = load(node._children[i])
+
+    def add(self, obj):
+        """ Add obj to the tree, maintaining the B-tree properties.
+
+        Returns the item added, or None if a matching object was already there.
+        An error writing back evicted pages comes after the change is made;
+        those pages stay cached and are retried.
+        """
+        key, node, i, found, path = self._find(obj)
+        if found:
+            return None
+        node._keys.insert(i, key)
+        node._items.insert(i, obj)
+        self._store.size += 1
+        self._split(node, path)
+        self._store.trim()
+        return obj
+
+    def _split(self, node, path):
+        """ (Private) Split node, and then its ancestors, while overfull. """
+        store = self._store
+        while len(node._items) >= self._order:
+            mid = len(node._items) // 2
+            median_key = node._keys[mid]
+            median = node._items[mid]
+            right = store.new(node._keys[mid + 1:], node._items[mid + 1:],
+                              node._children[mid + 1:])
+            del node._keys[mid:]
+            del node._items[mid:]
+            del node._children[mid + 1:]
+            store.save(node)
+            if not path:
+                root = store.new([median_key], [median],
+                                 [store.ref(node), store.ref(right)])
+                store.root = store.ref(root)
+                return
+            parent, i = path.pop()
+            parent._keys.insert(i, median_key)
+            parent._items.insert(i, median)
+            parent._children.insert(i + 1, store.ref(right))
+            node = parent
+        store.save(node)
+
+    def remove(self, searchitem):
+        """ Remove and return the object matching searchitem, if there.
+
+        Args:
+            searchitem - an object of any class stored in the tree
+        """
+        key, node, i, found, path = self._find(searchitem)
+        if not found:
+            return None
+        removed = node._items[i]
+        if node._children:
+            # replace it with its predecessor, which is always in a leaf
+            store = self._store
+            path.append((node, i))
+            leaf = store.load(node._children[i])
+            while leaf._children:
+                path.append((leaf, len(leaf._children) - 1))
+                leaf = store.load(leaf._children[-1])
+            node._keys[i] = leaf._keys.pop()
+            node._items[i] = leaf._items.pop()
+            store.save(node)
+            node = leaf
+        else:
+            del node._keys[i]
+            del node._items[i]
+        self._store.size -= 1
+        self._rebalance(node, path)
+        self._store.trim()
+        return removed
+
+    def _rebalance(self, node, path):
+        """ (Private) Refill node, and then its ancestors, while underfull. """
+        store = self._store
+        while path and len(node._items) < self._minitems:
+            parent, i = path.pop()
+            left = right = None
+            if i > 0:
+                left = store.load(parent._children[i - 1])
+                if len(left._items) > self._minitems:
+                    node._keys.insert(0, parent._keys[i - 1])
+                    node._items.insert(0, parent._items[i - 1])
+                    parent._keys[i - 1] = left._keys.pop()
+                    parent._items[i - 1] = left._items.pop()
+                    if left._children:
+                        node._children.insert(0, left._children.pop())
+                    store.save(left)
+                    store.save(parent)
+                    break
+            if i < len(parent._children) - 1:
+                right = store.load(parent._children[i + 1])
+                if len(right._items) > self._minitems:
+                    node._keys.append(parent._keys[i])
+                    node._items.append(parent._items[i])
+                    parent._keys[i] = right._keys.pop(0)
+                    parent._items[i] = right._items.pop(0)
+                    if right._children:
+                        node._children.append(right._children.pop(0))
+                    store.save(right)
+                    store.save(parent)
+                    break
+            if left is not None:
+                left._keys.append(parent._keys.pop(i - 1))
+                left._keys.extend(node._keys)
+                left._items.append(parent._items.pop(i - 1))
+                left._items.extend(node._items)
+                left._children.extend(node._children)
+                del parent._children[i]
+                store.save(left)
+                store.free(node)
+            else:
+                node._keys.append(parent._keys.pop(i))
+                node._keys.extend(right._keys)
+                node._items.append(parent._items.pop(i))
+                node._items.extend(right._items)
+                node._children.extend(right._children)
+                del parent._children[i + 1]
+                store.save(node)
+                store.free(right)
+            node = parent
+        else:
+            if not path and not node._items and node._children:
+                # the root has been emptied by a merge; its only child
+                # becomes the new root
+                store.root = node._children[0]
+                store.free(node)
+                return
+        store.save(node)
+
+    def flush(self):
+        """ Write any pending changes to the page file, if there is one. """
+        self._store.flush()
+
+    def close(self):
+        """ Flush and release the page file, if there is one. """
+        self._store.close()
+
+    def __enter__(self):
+        """ Return this tree, to be closed on leaving the with block. """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """ Close the tree. """
+        self.close()
+
+    def _test():
+        from bst import TestClass
+        tree = BTree(order=3)
+        for name in "MHSCEPXABDFGKLNOQRTUVWYZIJ":
+            tree.add(TestClass(name, name.lower()))
+            print('Ordered:', tree, '--', tree._stats())
+        for name in "AMZHCQXBEPSD":
+            tree.remove(TestClass(name))
+            print('Ordered:', tree, '--', tree._stats())
+        return tree
+
+#BTree._test()
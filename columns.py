@@ -0,0 +1,149 @@
+import numpy as np
+
+
+class MovieColumns:
+    """ A column-oriented copy of a movie library, held in NumPy arrays.
+
+    Rows are in title order. The columns are:
+        title_offsets - int64, length n + 1; the UTF-8 bytes of title i are
+            title_bytes[title_offsets[i]:title_offsets[i + 1]]
+        title_bytes - uint8, every title's UTF-8 bytes, end to end
+        dates - datetime64[D]; NaT where the date is missing or unreadable
+        runtimes - int32, in minutes; -1 where the runtime is missing or
+            unreadable
+
+    Dates and runtimes are parsed once, on export, so the analytics below
+    are plain vectorized operations. Rows without a runtime are left out of
+    the runtime statistics, and rows without a date are left out of the
+    per-year groups.
+    """
+
+    def __init__(self, title_offsets, title_bytes, dates, runtimes):
+        """ Initialise a MovieColumns from its four column arrays. """
+        self.title_offsets = title_offsets
+        self.title_bytes = title_bytes
+        self.dates = dates
+        self.runtimes = runtimes
+        self._years = None
+
+    @staticmethod
+    def from_movies(movies):
+        """ Return a MovieColumns holding the given movies, in that order.
+
+        Args:
+            movies - an iterable of Movie objects
+        """
+        encoded = []
+        dates = []
+        runtimes = []
+        for movie in movies:
+            encoded.append(movie._title.encode('utf8'))
+            dates.append(_parse_date(movie._date))
+            runtimes.append(_parse_runtime(movie._time))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(title) for title in encoded], out=offsets[1:])
+        return MovieColumns(
+            offsets,
+            np.frombuffer(b''.join(encoded), dtype=np.uint8).copy(),
+            np.array(dates, dtype='datetime64[D]'),
+            np.array(runtimes, dtype=np.int32))
+
+    def __len__(self):
+        """ Return the number of rows. """
+        return len(self.runtimes)
+
+    def title(self, index):
+        """ Return the title in row index. """
+        start = self.title_offsets[index]
+        end = self.title_offsets[index + 1]
+        return self.title_bytes[start:end].tobytes().decode('utf8')
+
+    def years(self):
+        """ Return the release year of each row as int64, -1 if unknown.
+
+        Converting dates to years is the costly step of grouping by year, so
+        the result is computed once and kept.
+        """
+        if self._years is None:
+            years = self.dates.astype('datetime64[Y]').astype(np.int64) + 1970
+            years[np.isnat(self.dates)] = -1
+            self._years = years
+        return self._years
+
+    def stats(self):
+        """ Return a dict of summary statistics of the runtimes.
+
+        The keys are count, mean, std, min, median and max. The statistics
+        are None when no row has a runtime.
+        """
+        runtimes = self.runtimes[self.runtimes >= 0]
+        if len(runtimes) == 0:
+            return {'count': 0, 'mean': None, 'std': None, 'min': None,
+                    'median': None, 'max': None}
+        return {'count': len(runtimes),
+                'mean': float(runtimes.mean()),
+                'std': float(runtimes.std()),
+                'min': int(runtimes.min()),
+                'median': float(np.median(runtimes)),
+                'max': int(runtimes.max())}
+
+    def histogram(self, bins=10, range=None):
+        """ Return (counts, edges), a histogram of the runtimes.
+
+        Args:
+            bins - the number of bins, or a sequence of bin edges
+            range - (low, high) limits of the bins; defaults to the data range
+        """
+        return np.histogram(self.runtimes[self.runtimes >= 0], bins, range)
+
+    def groupby_year(self, span=1):
+        """ Return per-period counts and mean runtimes.
+
+        Args:
+            span - the width of each period in years (10 groups by decade)
+
+        Returns:
+            (starts, counts, mean_runtimes):
+                starts is the first year of each period, in increasing order
+                counts is the number of movies released in each period
+                mean_runtimes is the mean runtime of those movies that have
+                    one, NaN where none does
+        """
+        years = self.years()
+        known = years >= 0
+        periods = years[known] // span
+        runtimes = self.runtimes[known]
+        if len(periods) == 0:
+            return (np.zeros(0, np.int64), np.zeros(0, np.int64),
+                    np.zeros(0, np.float64))
+        # years span a small range, so counting into bins offset from the
+        # first period is linear, where sorting (np.unique) is not
+        first = periods.min()
+        groups = periods - first
+        timed = runtimes >= 0
+        counts = np.bincount(groups)
+        totals = np.bincount(groups[timed], weights=runtimes[timed],
+                             minlength=len(counts))
+        ntimed = np.bincount(groups[timed], minlength=len(counts))
+        present = np.flatnonzero(counts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = totals[present] / ntimed[present]
+        return ((present + first) * span, counts[present], means)
+
+
+def _parse_date(date):
+    """ (Private) Return a dd/mm/yyyy date as a datetime64, or NaT. """
+    try:
+        day, month, year = str(date).strip().split('/')
+        return np.datetime64('%04d-%02d-%02d' % (int(year), int(month),
+                                                 int(day)), 'D')
+    except ValueError:
+        return np.datetime64('NaT', 'D')
+
+
+def _parse_runtime(runtime):
+    """ (Private) Return a runtime as an int, or -1 if it is unreadable. """
+    try:
+        return int(str(runtime).strip())
+    except ValueError:
+        return -1
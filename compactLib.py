@@ -0,0 +1,474 @@
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from movieLib import Movie, COLLATIONS
+
+DEFAULT_BLOCK_SIZE = 16
+
+_MAGIC = b'PYFLIXCL'
+_VERSION = 1
+_HEADER = struct.Struct('<8sI')
+
+# tags for the values in a _ValueColumn snapshot
+_NONE = 0
+_INT = 1
+_STR = 2
+
+
+def _put_varint(out, value):
+    """ (Private) Append value to the bytearray out, 7 bits per byte. """
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _get_varint(data, pos):
+    """ (Private) Return (value, next position) of the varint at data[pos]. """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (value, pos)
+        shift += 7
+
+def _put_bytes(out, data):
+    """ (Private) Append data to the bytearray out, prefixed by its length. """
+    _put_varint(out, len(data))
+    out += data
+
+def _get_bytes(data, pos):
+    """ (Private) Return (bytes, next position) of the bytes at data[pos]. """
+    length, pos = _get_varint(data, pos)
+    if pos + length > len(data):
+        raise ValueError('truncated CompactMovieLib snapshot')
+    return (bytes(data[pos:pos + length]), pos + length)
+
+
+class FrontCodedList:
+    """ A read-only list of strings, stored front-coded in blocks.
+
+    The strings are split into blocks of block_size. The first string of
+    each block (its head) is kept whole; each of the others is kept as the
+    length of the prefix it shares with the string before it, plus the rest
+    of its UTF-8 bytes. Sorted strings share long prefixes, so this is much
+    smaller than a list of str. index() binary-searches the heads and then
+    decodes a single block.
+    """
+
+    def __init__(self, strings, block_size=DEFAULT_BLOCK_SIZE):
+        """ Initialise a FrontCodedList holding strings, in that order. """
+        if block_size < 1:
+            raise ValueError('block_size must be at least 1')
+        self._block_size = block_size
+        self._heads = []
+        self._blocks = []
+        self._len = 0
+        block = bytearray()
+        previous = b''
+        for string in strings:
+            encoded = string.encode('utf8')
+            if self._len % block_size == 0:
+                if self._len:
+                    self._blocks.append(bytes(block))
+                    block = bytearray()
+                self._heads.append(string)
+            else:
+                shared = 0
+                limit = min(len(previous), len(encoded))
+                while shared < limit and previous[shared] == encoded[shared]:
+                    shared += 1
+                _put_varint(block, shared)
+                _put_varint(block, len(encoded) - shared)
+                block += encoded[shared:]
+            previous = encoded
+            self._len += 1
+        if self._len:
+            self._blocks.append(bytes(block))
+
+    def __len__(self):
+        """ Return the number of strings. """
+        return self._len
+
+    def __getitem__(self, index):
+        """ Return the string at position index. """
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('FrontCodedList index out of range')
+        block, offset = divmod(index, self._block_size)
+        return self._decode(block)[offset]
+
+    def __iter__(self):
+        """ Iterate over the strings in order. """
+        for block in range(len(self._blocks)):
+            yield from self._decode(block)
+
+    def _decode(self, block):
+        """ (Private) Return the list of strings in the given block. """
+        head = self._heads[block]
+        strings = [head]
+        data = self._blocks[block]
+        previous = head.encode('utf8')
+        pos = 0
+        while pos < len(data):
+            shared, pos = _get_varint(data, pos)
+            length, pos = _get_varint(data, pos)
+            previous = previous[:shared] + data[pos:pos + length]
+            pos += length
+            strings.append(previous.decode('utf8'))
+        return strings
+
+    def _dump(self, out):
+        """ (Private) Append this list to the bytearray out, for a snapshot.
+        """
+        _put_varint(out, self._block_size)
+        _put_varint(out, self._len)
+        for head, block in zip(self._heads, self._blocks):
+            _put_bytes(out, head.encode('utf8'))
+            _put_bytes(out, block)
+
+    @staticmethod
+    def _load(data, pos):
+        """ (Private) Return (list, next position) of the list at data[pos].
+        """
+        block_size, pos = _get_varint(data, pos)
+        strings = FrontCodedList((), block_size)
+        strings._len, pos = _get_varint(data, pos)
+        for block in range(-(-strings._len // block_size)):
+            head, pos = _get_bytes(data, pos)
+            strings._heads.append(head.decode('utf8'))
+            block, pos = _get_bytes(data, pos)
+            strings._blocks.append(block)
+        return (strings, pos)
+
+    def lower_bound(self, string):
+        """ Return the position of the first string not before string.
+
+        The strings must be in sorted order.
+        """
+        block = bisect_right(self._heads, string) - 1
+        if block < 0:
+            return 0
+        for offset, candidate in enumerate(self._decode(block)):
+            if not candidate < string:
+                return block * self._block_size + offset
+        return min((block + 1) * self._block_size, self._len)
+
+    def iter_from(self, index):
+        """ Iterate over the strings in order, from position index on. """
+        block, offset = divmod(index, self._block_size)
+        if block < len(self._blocks):
+            yield from self._decode(block)[offset:]
+            for block in range(block + 1, len(self._blocks)):
+                yield from self._decode(block)
+
+    def index(self, string):
+        """ Return the position of string, or -1 if it is not there.
+
+        The strings must be in sorted order.
+        """
+        block = bisect_right(self._heads, string) - 1
+        if block < 0:
+            return -1
+        head = self._heads[block]
+        if head == string:
+            return block * self._block_size
+        # walk the block comparing UTF-8 bytes, which order the same way
+        # as the strings do, and stop as soon as we have passed string
+        target = string.encode('utf8')
+        data = self._blocks[block]
+        previous = head.encode('utf8')
+        pos = 0
+        offset = 0
+        while pos < len(data):
+            shared = data[pos]
+            if shared < 0x80:
+                pos += 1
+            else:
+                shared, pos = _get_varint(data, pos)
+            length = data[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = _get_varint(data, pos)
+            previous = previous[:shared] + data[pos:pos + length]
+            pos += length
+            offset += 1
+            if previous == target:
+                return block * self._block_size + offset
+            if target < previous:
+                break
+        return -1
+
+
+class _ValueColumn:
+    """ (Private) A read-only list of the dates, or runtimes, of movies.
+
+    Few movies have a date or runtime no other movie has, so each distinct
+    value is kept once and the list holds a fixed-width array of indexes
+    into those values: one or two bytes per movie, rather than a pointer
+    and (when read from a file) a string of its own. Values may be strings,
+    integers or None.
+    """
+
+    def __init__(self, values):
+        """ Initialise a _ValueColumn holding values, in that order. """
+        self._values = []
+        positions = {}
+        codes = []
+        for value in values:
+            if value is not None and type(value) not in (int, str):
+                raise TypeError('cannot store a ' + type(value).__name__
+                                + ' in a CompactMovieLib')
+            # (type, value) so that 1 and '1' stay apart
+            code = positions.setdefault((type(value), value),
+                                        len(self._values))
+            if code == len(self._values):
+                self._values.append(value)
+            codes.append(code)
+        self._codes = array(self._typecode(len(self._values)), codes)
+
+    @staticmethod
+    def _typecode(count):
+        """ (Private) Return the array typecode for count distinct values. """
+        if count <= 1 << 8:
+            return 'B'
+        if count <= 1 << 16:
+            return 'H'
+        return 'I'
+
+    def __len__(self):
+        """ Return the number of values. """
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        """ Return the value at position index. """
+        return self._values[self._codes[index]]
+
+    def _dump(self, out):
+        """ (Private) Append this column to the bytearray out, for a snapshot.
+        """
+        _put_varint(out, len(self._values))
+        for value in self._values:
+            if value is None:
+                out.append(_NONE)
+            elif type(value) is int:
+                out.append(_INT)
+                # zigzag, so that negative values stay short
+                _put_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+            else:
+                out.append(_STR)
+                _put_bytes(out, value.encode('utf8'))
+        codes = array(self._codes.typecode, self._codes)
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        _put_varint(out, len(codes))
+        out += codes.tobytes()
+
+    @staticmethod
+    def _load(data, pos):
+        """ (Private) Return (column, next position) of the column at
+        data[pos].
+        """
+        column = _ValueColumn(())
+        count, pos = _get_varint(data, pos)
+        for i in range(count):
+            tag = data[pos]
+            pos += 1
+            if tag == _NONE:
+                column._values.append(None)
+            elif tag == _INT:
+                value, pos = _get_varint(data, pos)
+                column._values.append(value >> 1 if value % 2 == 0
+                                      else -(value >> 1) - 1)
+            elif tag == _STR:
+                value, pos = _get_bytes(data, pos)
+                column._values.append(value.decode('utf8'))
+            else:
+                raise ValueError('bad value in CompactMovieLib snapshot')
+        length, pos = _get_varint(data, pos)
+        codes = array(_ValueColumn._typecode(count))
+        end = pos + codes.itemsize * length
+        if end > len(data):
+            raise ValueError('truncated CompactMovieLib snapshot')
+        codes.frombytes(data[pos:end])
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        if codes and max(codes) >= count:
+            raise ValueError('bad value in CompactMovieLib snapshot')
+        column._codes = codes
+        return (column, end)
+
+
+class CompactMovieLib:
+    """ A compact, read-only movie library.
+
+    Holds the same movies as a MovieLib, in title order, with the sort keys
+    (and, where the collation changes them, the titles) front-coded (see
+    FrontCodedList), and the dates and runtimes each as an array of small
+    indexes into their distinct values, rather than as a tree of Movie
+    objects. search() works as MovieLib.search does. A CompactMovieLib can
+    be saved to a snapshot file and loaded again.
+    """
+
+    def __init__(self, movies, collation='exact',
+                 block_size=DEFAULT_BLOCK_SIZE):
+        """ Initialise a CompactMovieLib.
+
+        Args:
+            movies - an iterable of Movie objects in sort key order, such as
+                MovieLib.movies()
+            collation - the collation the movies are ordered by
+            block_size - the number of titles in each front-coded block
+        """
+        if collation not in COLLATIONS:
+            raise ValueError('unknown collation: ' + str(collation))
+        self._collation = collation
+        keys = []
+        titles = []
+        dates = []
+        runtimes = []
+        for movie in movies:
+            keys.append(movie.sort_key())
+            titles.append(movie.get_title())
+            dates.append(movie._date)
+            runtimes.append(movie._time)
+        self._dates = _ValueColumn(dates)
+        self._runtimes = _ValueColumn(runtimes)
+        self._keys = FrontCodedList(keys, block_size)
+        if keys == titles:
+            # titles are their own keys (always so under 'exact')
+            self._titles = None
+        else:
+            self._titles = FrontCodedList(titles, block_size)
+
+    def __str__(self):
+        """ Return a string representation of the library.
+
+        The string will be created by an in-order traversal.
+        """
+        return ''.join(title + ' ' for title in self._title_list())
+
+    def _title_list(self):
+        """ (Private) Return the front-coded list that holds the titles. """
+        if self._titles is None:
+            return self._keys
+        return self._titles
+
+    def _movie(self, index):
+        """ (Private) Return a Movie for the entry at position index. """
+        return Movie(self._title_list()[index], self._dates[index],
+                     self._runtimes[index], self._collation)
+
+    def size(self):
+        """ Return the number of movies in the library. """
+        return len(self._keys)
+
+    def search(self, title):
+        """ Return Movie with matching title if there, or None.
+
+        Args:
+            title: a string representing a movie title.
+        """
+        index = self._keys.index(COLLATIONS[self._collation](title))
+        if index < 0:
+            return None
+        return self._movie(index)
+
+    def prefix(self, prefix, limit=None):
+        """ Return a list of the Movies whose titles start with prefix.
+
+        Args:
+            prefix - the start of the titles, matched under the collation
+            limit - the most Movies to return, or None for all of them
+        """
+        key = COLLATIONS[self._collation](prefix)
+        found = []
+        start = self._keys.lower_bound(key)
+        for index, candidate in enumerate(self._keys.iter_from(start), start):
+            if not candidate.startswith(key):
+                break
+            if limit is not None and len(found) >= limit:
+                break
+            found.append(self._movie(index))
+        return found
+
+    def add(self, title, date, runtime):
+        """ Refuse to add a movie; a CompactMovieLib is read-only. """
+        raise TypeError('a CompactMovieLib is read-only')
+
+    def remove(self, title):
+        """ Refuse to remove a movie; a CompactMovieLib is read-only. """
+        raise TypeError('a CompactMovieLib is read-only')
+
+    def movies(self):
+        """ Generate the movies in the library, in title order. """
+        for index, title in enumerate(self._title_list()):
+            yield Movie(title, self._dates[index], self._runtimes[index],
+                        self._collation)
+
+    def to_columns(self):
+        """ Return the library as a columns.MovieColumns, in title order.
+
+        Needs NumPy.
+        """
+        from columns import MovieColumns
+        return MovieColumns.from_movies(self.movies())
+
+    def save(self, filename):
+        """ Write a snapshot of this library to filename.
+
+        A snapshot is a header (a magic string and a format version), then
+        the collation name, the front-coded keys and titles (their heads
+        and block bytes as they are held in memory), and the date and
+        runtime columns.
+        """
+        out = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+        _put_bytes(out, self._collation.encode('utf8'))
+        self._keys._dump(out)
+        if self._titles is None:
+            out.append(0)
+        else:
+            out.append(1)
+            self._titles._dump(out)
+        self._dates._dump(out)
+        self._runtimes._dump(out)
+        with open(filename, 'wb') as file:
+            file.write(out)
+
+    @staticmethod
+    def load(filename):
+        """ Return the CompactMovieLib in the snapshot file filename. """
+        with open(filename, 'rb') as file:
+            data = memoryview(file.read())
+        if len(data) < _HEADER.size:
+            raise ValueError(filename + ' is not a CompactMovieLib snapshot')
+        magic, version = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError(filename + ' is not a CompactMovieLib snapshot')
+        if version != _VERSION:
+            raise ValueError('unsupported CompactMovieLib snapshot version '
+                             + str(version))
+        try:
+            collation, pos = _get_bytes(data, _HEADER.size)
+            library = CompactMovieLib((), collation.decode('utf8'))
+            library._keys, pos = FrontCodedList._load(data, pos)
+            has_titles = data[pos]
+            pos += 1
+            if has_titles:
+                library._titles, pos = FrontCodedList._load(data, pos)
+            library._dates, pos = _ValueColumn._load(data, pos)
+            library._runtimes, pos = _ValueColumn._load(data, pos)
+        except IndexError:
+            raise ValueError('truncated CompactMovieLib snapshot')
+        if pos != len(data) or not (len(library._keys)
+                                    == len(library._dates)
+                                    == len(library._runtimes)):
+            raise ValueError(filename + ' is not a valid CompactMovieLib'
+                             ' snapshot')
+        return library
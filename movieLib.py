@@ -1,257 +1,470 @@
-from functools import total_ordering
-
-@total_ordering
-class Movie:
-    """ Represents a single Movie. """
-
-    def __init__(self, i_title, i_date=None, i_runtime=None):
-        """ Initialise a Movie Object. """
-        self._title = i_title
-        self._date = i_date
-        self._time = i_runtime
-
-    def __str__(self):
-        """ Return a short string representation of this movie. """
-        outstr = self._title
-        return outstr
-
-    def full_str(self):
-        """ Return a full string representation of this movie. """
-        outstr = self._title + ": "
-        outstr = outstr + str(self._date) + "; "
-        outstr = outstr + str(self._time)
-        return outstr
-
-    def get_title(self):
-        """ Return the title of this movie. """
-        return self._title
-
-    def __eq__(self, other):
-        """ Return True if this movie has exactly same title as other. """
-        if (other._title == self._title):
-            return True
-        return False
-
-    def __ne__(self, other):
-        """ Return False if this movie has exactly same title as other. """
-        return not (self._title == other._title)
-
-    def __lt__(self, other):
-        """ Return True if this movie is ordered before other.
-
-        A movie is less than another if it's title is alphabetically before.
-        """
-        if other._title > self._title:
-            return True
-        return False
-
-
-from bst import BSTNode
-
-
-class MovieLib:
-    """ A movie library.
-
-    Implemented using a BST. 
-    """
-    
-    def __init__(self):
-        """ Initialise a movie library. """
-        self.bst = None
-
-    def __str__(self):
-        """ Return a string representation of the library.
-
-        The string will be created by an in-order traversal.
-        """
-        # method goes here
-        if self.bst is not None:
-            return str(self.bst)
-        return None
-
-    def size(self):
-        """ Return the number of movies in the library. """
-        # method goes here
-        # calling bst
-        if self.bst is not None:
-            return self.bst.size()
-        return None
-
-
-    def search(self, title):
-        """ Return Movie with matching title if there, or None.
-
-        Args:
-            title: a string representing a movie title.
-        """
-        # method goes here
-        # Note that the BST requires an object to search for, and we don't
-        # necessarily know the details of the movie we are looking for except
-        # its title. But Movie objects are compared only on their titles (see
-        # the __eq__ method above in teh Movie class).
-        # Create a new Movie object with that title, and ise that to search 
-        # search the BST.
-
-        if self.bst is not None:
-            movie = Movie(title)
-            return self.bst.search(movie)
-        return None
-
-
-    def add(self, title, date, runtime):
-        """ Add a new move to the library.
-
-        Args:
-            title - the title of the movie
-            date - the date the movie was released
-            runtime - the running time of the movie
-
-        Returns:
-            the movie file that was added, or None
-        """
-        # method body goes here
-        # you need to create the Movie object, then add it to the BST,
-        # take what is returned from that method, and then decide what to
-        # return here.
-        # Remember to handle the case where the bst is empty.
-        # check to see if bst is None -
-        movie = Movie(title, date, runtime)
-        if self.bst is None:
-            self.bst = BSTNode(movie)
-            return movie
-        return self.bst.add(movie)
-
-    def remove(self, title):
-        """ Remove and return the a movie object with the given title, if there.
-
-        Args:
-            title - the title of the movie to be removed
-        """
-        # method body goes here
-
-        if self.bst is not None:
-            movie = Movie(title)
-            return self.bst.remove(movie)
-
-    def _testadd():
-        library = MovieLib()
-        library.add("Memento", "11/10/2000", 113)
-        print(str(library))
-        print('> adding Melvin and Howard')
-        library.add("Melvin and Howard", "19/09/1980", 95)
-        print(str(library))
-        print('> adding a second version of Melvin and Howard')
-        library.add("Melvin and Howard", "21/03/2007", 112)
-        print(str(library))
-        print('> adding Mellow Mud')
-        library.add("Mellow Mud", "21/09/2016", 92)
-        print(str(library))
-        print('> adding Melody')
-        library.add("Melody", "21/03/2007", 113)
-        print(str(library))
-        return library
-            
-    def _test():
-        library = MovieLib()
-        library.add("B", "b", 1)
-        print('Library:', library)
-        print('adding', "A")
-        library.add("A", "a", 1)
-        print('Library:', library)
-        print('removing', "A")
-        library.remove("A")
-        print('Library:', library)
-        print('adding', "C")
-        library.add("C", "c", 1)
-        print('Library:', library)
-        print('removing', "C")
-        library.remove("C")
-        print('Library:', library)
-        print('adding', "F")
-        library.add("F", "f", 1)
-        print('Library:', library)
-        print('removing', "B")
-        library.remove("B")
-        print('Library:', library)
-        print('adding', "C")
-        library.add("C", "c", 1)
-        print('Library:', library)
-        print('adding', "D")
-        library.add("D", "d", 1)
-        print('Library:', library)
-        print('adding', "C")
-        library.add("C", "c", 1)
-        print('Library:', library)
-        print('adding', "E")
-        library.add("E", "e", 1)
-        print('Library:', library)
-        print('removing', "B")
-        library.remove("B")
-        print('Library:', library)
-        print('removing', "D")
-        library.remove("D")
-        print('Library:', library)
-        print('removing', "C")
-        library.remove("C")
-        print('Library:', library)
-        print('removing', "E")
-        library.remove("E")
-        print('Library:', library)
-        print('adding', "L")
-        library.add("L", "l", 1)
-        print('Library:', library)
-        print('adding', "H")
-        library.add("H", "h", 1)
-        print('Library:', library)
-        print('adding', "I")
-        library.add("I", "i", 1)
-        print('Library:', library)
-        print('adding', "G")
-        library.add("G", "g", 1)
-        print('Library:', library)
-        print('removing', "L")
-        library.remove("L")
-        print('Library:', library)
-        print('removing', "H")
-        library.remove("H")
-        print('Library:', library)
-        print('removing', "I")
-        library.remove("I")
-        print('Library:', library)
-        print('removing', "G")
-        library.remove("G")
-        print('Library:', library)
-
-            
-
-def build_library(filename):
-    """ Return a library of Movie files built from filename """
-
-    # open the file
-    file = open(filename, 'r', encoding="utf8")
-
-    # create the library
-    library = MovieLib()
-
-    filecount = 0
-    count = 0
-
-    # now cycle through the  lines in the file, adding the movies to the
-    # library
-    for line in file:
-        filecount += 1
-        inputlist = line.split('\t')
-        added = library.add(inputlist[0], inputlist[1], inputlist[2])
-        if added is not None:
-            count += 1
-
-    # print out some info for sanity checking
-    print("read a file with", filecount, "movies")
-    print("Built a library with", count, "unique movie titles")
-    return library
-
-#MovieLib._test()
-# print('++++++++++')
-# MovieLib._test()
-
-# newlibrary = build_library('small_repeated_movies.txt')
+import random
+import unicodedata
+from functools import total_ordering
+
+
+def _exact(title):
+    """ (Private) Return the collation key of title, compared exactly. """
+    return title
+
+def _fold(title):
+    """ (Private) Return the collation key of title, ignoring case and accents.
+    """
+    decomposed = unicodedata.normalize('NFKD', title.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+# The ways titles can be ordered. Under 'fold', titles that differ only in
+# case or accents ("Amelie", "AMÉLIE") count as the same title.
+COLLATIONS = {'exact': _exact, 'fold': _fold}
+
+
+@total_ordering
+class Movie:
+    """ Represents a single Movie. """
+
+    def __init__(self, i_title, i_date=None, i_runtime=None,
+                 collation='exact'):
+        """ Initialise a Movie Object.
+
+        The sort key of the title under the named collation (see COLLATIONS)
+        is computed once here, so that comparisons are plain key comparisons.
+        """
+        self._title = i_title
+        self._date = i_date
+        self._time = i_runtime
+        self._key = COLLATIONS[collation](i_title)
+
+    def __str__(self):
+        """ Return a short string representation of this movie. """
+        outstr = self._title
+        return outstr
+
+    def full_str(self):
+        """ Return a full string representation of this movie. """
+        outstr = self._title + ": "
+        outstr = outstr + str(self._date) + "; "
+        outstr = outstr + str(self._time)
+        return outstr
+
+    def get_title(self):
+        """ Return the title of this movie. """
+        return self._title
+
+    def sort_key(self):
+        """ Return the collation key this movie is ordered by. """
+        return self._key
+
+    def __eq__(self, other):
+        """ Return True if this movie has the same sort key as other. """
+        return self._key == other._key
+
+    def __ne__(self, other):
+        """ Return False if this movie has the same sort key as other. """
+        return self._key != other._key
+
+    def __lt__(self, other):
+        """ Return True if this movie is ordered before other.
+
+        A movie is less than another if it's sort key is alphabetically before.
+        """
+        return self._key < other._key
+
+
+from bst import BSTNode, build_balanced
+from btree import BTree
+from validate import InvariantError, check_path, check_tree
+
+
+class MovieLib:
+    """ A movie library.
+
+    Implemented using a BST, or optionally a B-tree (see btree.BTree).
+
+    With tombstones on, removing a movie from the BST only marks its node as
+    removed. Once the removed nodes make up more than compact_ratio of the
+    tree, or all of it, the tree is rebuilt, balanced, from the movies that
+    remain.
+
+    With validation on, the BST is checked after adds and removes (see the
+    validate module): 'path' checks just the nodes each update can have
+    changed, and 'full' checks the whole tree. sample_rate is the fraction
+    of updates that are checked, so that checking can stay on in production.
+    A failed check is passed to on_violation, which by default raises an
+    InvariantError.
+    """
+    
+    def __init__(self, engine='bst', collation='exact', tombstones=False,
+                 compact_ratio=0.5, validation=None, sample_rate=1.0,
+                 on_violation=None, **options):
+        """ Initialise a movie library.
+
+        Args:
+            engine - 'bst' for a binary search tree, or 'btree' for a B-tree
+            collation - how titles are ordered and matched: 'exact', or
+                'fold' to ignore case and accents (see COLLATIONS)
+            tombstones - True to remove movies from the BST by marking them
+            compact_ratio - the fraction of tombstones in the BST that
+                triggers compaction
+            validation - None, 'path' or 'full': what to check after updates
+            sample_rate - the fraction of updates to check
+            on_violation - called with the ValidationReport of a failed
+                check; None to raise InvariantError
+            options - passed on to BTree (order, pagefile, page_size,
+                cache_pages) when engine is 'btree'; a page file made under
+                another collation is refused
+        """
+        # check everything before a page file is opened, so that a bad
+        # argument cannot leave one open
+        if engine == 'bst':
+            if options:
+                raise TypeError('the bst engine takes no options')
+        elif engine == 'btree':
+            if tombstones:
+                raise ValueError('tombstones are only used by the bst engine')
+            if validation is not None:
+                raise ValueError('validation is only done for the bst engine')
+        else:
+            raise ValueError('unknown engine: ' + str(engine))
+        if collation not in COLLATIONS:
+            raise ValueError('unknown collation: ' + str(collation))
+        if not 0 < compact_ratio <= 1:
+            raise ValueError('compact_ratio must be in (0, 1]')
+        if validation not in (None, 'path', 'full'):
+            raise ValueError('unknown validation: ' + str(validation))
+        if not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be in [0, 1]')
+        if engine == 'btree':
+            self.bst = BTree(collation=collation, **options)
+        else:
+            self.bst = None
+        self._engine = engine
+        self._collation = collation
+        self._tombstones = tombstones
+        self._compact_ratio = compact_ratio
+        self._validation = validation
+        self._sample_rate = sample_rate
+        self._on_violation = on_violation
+        # the number of BST nodes, and how many of them are tombstones
+        self._nodes = 0
+        self._dead = 0
+
+    def __str__(self):
+        """ Return a string representation of the library.
+
+        The string will be created by an in-order traversal.
+        """
+        # method goes here
+        if self.bst is not None:
+            return str(self.bst)
+        return None
+
+    def size(self):
+        """ Return the number of movies in the library. """
+        # method goes here
+        # calling bst
+        if self.bst is None:
+            return None
+        if self._engine == 'bst':
+            # kept up to date by add and remove, rather than walking the tree
+            return self._nodes - self._dead
+        return self.bst.size()
+
+
+    def search(self, title):
+        """ Return Movie with matching title if there, or None.
+
+        Args:
+            title: a string representing a movie title.
+        """
+        # method goes here
+        # Note that the BST requires an object to search for, and we don't
+        # necessarily know the details of the movie we are looking for except
+        # its title. But Movie objects are compared only on their titles (see
+        # the __eq__ method above in teh Movie class).
+        # Create a new Movie object with that title, and ise that to search 
+        # search the BST.
+
+        if self.bst is not None:
+            movie = Movie(title, collation=self._collation)
+            return self.bst.search(movie)
+        return None
+
+
+    def prefix(self, prefix, limit=None):
+        """ Return a list of the Movies whose titles start with prefix.
+
+        Args:
+            prefix - the start of the titles, matched under the collation
+            limit - the most Movies to return, or None for all of them
+        """
+        key = COLLATIONS[self._collation](prefix)
+        found = []
+        if self.bst is None:
+            return found
+        for movie in self.bst.inorder_from(key):
+            if not movie.sort_key().startswith(key):
+                break
+            if limit is not None and len(found) >= limit:
+                break
+            found.append(movie)
+        return found
+
+    def add(self, title, date, runtime):
+        """ Add a new move to the library.
+
+        Args:
+            title - the title of the movie
+            date - the date the movie was released
+            runtime - the running time of the movie
+
+        Returns:
+            the movie file that was added, or None
+        """
+        # method body goes here
+        # you need to create the Movie object, then add it to the BST,
+        # take what is returned from that method, and then decide what to
+        # return here.
+        # Remember to handle the case where the bst is empty.
+        # check to see if bst is None -
+        movie = Movie(title, date, runtime, self._collation)
+        if self.bst is None:
+            self.bst = BSTNode(movie)
+            self._nodes = 1
+            added = movie
+        elif self._tombstones:
+            added, revived = self.bst.insert(movie)
+            if revived:
+                self._dead -= 1
+            elif added is not None:
+                self._nodes += 1
+        else:
+            added = self.bst.add(movie)
+            if added is not None:
+                self._nodes += 1
+        if added is not None:
+            self._check_update(movie)
+        return added
+
+    def remove(self, title):
+        """ Remove and return the a movie object with the given title, if there.
+
+        Args:
+            title - the title of the movie to be removed
+        """
+        if self.bst is None:
+            return None
+        movie = Movie(title, collation=self._collation)
+        if self._tombstones:
+            removed = self.bst.mark_removed(movie)
+            if removed is not None:
+                self._dead += 1
+                if (self._dead == self._nodes
+                        or self._dead > self._compact_ratio * self._nodes):
+                    # with every movie gone this empties the library, as
+                    # removing the last one does without tombstones
+                    self.compact()
+                self._check_update(movie)
+            return removed
+        removed = self.bst.remove(movie)
+        if removed is not None and self._engine == 'bst':
+            self._nodes -= 1
+            if self.bst._element is removed and self.bst.leaf():
+                # the last movie has gone, and a root can't unlink itself
+                self.bst = None
+            self._check_update(movie)
+        return removed
+
+    def validate(self):
+        """ Check the whole BST, and return a validate.ValidationReport. """
+        if self._engine != 'bst':
+            raise ValueError('validation is only done for the bst engine')
+        return check_tree(self.bst, self._nodes, self._dead)
+
+    def _check_update(self, movie):
+        """ (Private) Check the BST after movie was added or removed.
+
+        Does nothing unless validation is on and this update is sampled.
+        """
+        if self._validation is None:
+            return
+        if self._sample_rate < 1 and random.random() >= self._sample_rate:
+            return
+        if self._validation == 'path':
+            report = check_path(self.bst, movie.sort_key())
+        else:
+            report = self.validate()
+        if report.ok():
+            return
+        if self._on_violation is None:
+            raise InvariantError(report)
+        self._on_violation(report)
+
+    def movies(self):
+        """ Generate the movies in the library, in title order. """
+        if self.bst is not None:
+            yield from self.bst.inorder()
+
+    def to_columns(self):
+        """ Return the library as a columns.MovieColumns, in title order.
+
+        Needs NumPy.
+        """
+        from columns import MovieColumns
+        return MovieColumns.from_movies(self.movies())
+
+    def freeze(self, block_size=16):
+        """ Return a read-only compactLib.CompactMovieLib of this library.
+
+        Args:
+            block_size - the number of titles in each front-coded block
+        """
+        from compactLib import CompactMovieLib
+        return CompactMovieLib(self.movies(), self._collation, block_size)
+
+    def compact(self):
+        """ Rebuild the BST, balanced, without its tombstones. """
+        if self._engine != 'bst' or self.bst is None:
+            return
+        movies = list(self.bst.inorder())
+        self.bst = build_balanced(movies)
+        self._nodes = len(movies)
+        self._dead = 0
+
+    def close(self):
+        """ Flush and release the library's page file, if it has one. """
+        if self._engine == 'btree':
+            self.bst.close()
+
+    def __enter__(self):
+        """ Return this library, to be closed on leaving the with block. """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """ Close the library. """
+        self.close()
+
+    def _testadd():
+        library = MovieLib()
+        library.add("Memento", "11/10/2000", 113)
+        print(str(library))
+        print('> adding Melvin and Howard')
+        library.add("Melvin and Howard", "19/09/1980", 95)
+        print(str(library))
+        print('> adding a second version of Melvin and Howard')
+        library.add("Melvin and Howard", "21/03/2007", 112)
+        print(str(library))
+        print('> adding Mellow Mud')
+        library.add("Mellow Mud", "21/09/2016", 92)
+        print(str(library))
+        print('> adding Melody')
+        library.add("Melody", "21/03/2007", 113)
+        print(str(library))
+        return library
+            
+    def _test():
+        library = MovieLib()
+        library.add("B", "b", 1)
+        print('Library:', library)
+        print('adding', "A")
+        library.add("A", "a", 1)
+        print('Library:', library)
+        print('removing', "A")
+        library.remove("A")
+        print('Library:', library)
+        print('adding', "C")
+        library.add("C", "c", 1)
+        print('Library:', library)
+        print('removing', "C")
+        library.remove("C")
+        print('Library:', library)
+        print('adding', "F")
+        library.add("F", "f", 1)
+        print('Library:', library)
+        print('removing', "B")
+        library.remove("B")
+        print('Library:', library)
+        print('adding', "C")
+        library.add("C", "c", 1)
+        print('Library:', library)
+        print('adding', "D")
+        library.add("D", "d", 1)
+        print('Library:', library)
+        print('adding', "C")
+        library.add("C", "c", 1)
+        print('Library:', library)
+        print('adding', "E")
+        library.add("E", "e", 1)
+        print('Library:', library)
+        print('removing', "B")
+        library.remove("B")
+        print('Library:', library)
+        print('removing', "D")
+        library.remove("D")
+        print('Library:', library)
+        print('removing', "C")
+        library.remove("C")
+        print('Library:', library)
+        print('removing', "E")
+        library.remove("E")
+        print('Library:', library)
+        print('adding', "L")
+        library.add("L", "l", 1)
+        print('Library:', library)
+        print('adding', "H")
+        library.add("H", "h", 1)
+        print('Library:', library)
+        print('adding', "I")
+        library.add("I", "i", 1)
+        print('Library:', library)
+        print('adding', "G")
+        library.add("G", "g", 1)
+        print('Library:', library)
+        print('removing', "L")
+        library.remove("L")
+        print('Library:', library)
+        print('removing', "H")
+        library.remove("H")
+        print('Library:', library)
+        print('removing', "I")
+        library.remove("I")
+        print('Library:', library)
+        print('removing', "G")
+        library.remove("G")
+        print('Library:', library)
+
+            
+
+def build_library(filename, engine='bst', collation='exact', **options):
+    """ Return a library of Movie files built from filename
+
+    The engine, collation and options are passed on to MovieLib.
+    """
+
+    # open the file
+    file = open(filename, 'r', encoding="utf8")
+
+    # create the library
+    library = MovieLib(engine, collation, **options)
+
+    filecount = 0
+    count = 0
+
+    # now cycle through the  lines in the file, adding the movies to the
+    # library
+    for line in file:
+        filecount += 1
+        inputlist = line.split('\t')
+        added = library.add(inputlist[0], inputlist[1], inputlist[2])
+        if added is not None:
+            count += 1
+
+    # print out some info for sanity checking
+    print("read a file with", filecount, "movies")
+    print("Built a library with", count, "unique movie titles")
+    return library
+
+#MovieLib._test()
+# print('++++++++++')
+# MovieLib._test()
+
+# newlibrary = build_library('small_repeated_movies.txt')
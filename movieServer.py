@@ -0,0 +1,390 @@
+""" Serve a movie library over a local socket.
+
+The protocol is one JSON object per line. A request names an operation and
+carries an id, which the response echoes:
+
+    {"id": 1, "op": "search", "title": "Memento"}
+    {"id": 1, "result": {"title": "Memento", "date": "11/10/2000",
+                         "runtime": 113}}
+
+The operations are search (title), prefix (prefix, optional limit), size,
+add (title, date, runtime) and remove (title). A failed request gets
+{"id": ..., "error": "message"} instead of a result.
+
+Requests may be pipelined: a client can send many before reading any
+responses, which may then arrive in a different order. Identical lookups
+that are in flight at the same time are answered by a single library call.
+Each connection has at most max_pending requests in progress; past that the
+server stops reading from it until some are answered.
+
+Usage: python movieServer.py FILENAME (--unix PATH | --port PORT)
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from movieLib import Movie, build_library
+
+DEFAULT_MAX_PENDING = 64
+LINE_LIMIT = 1 << 16
+
+_LOOKUPS = ('search', 'prefix', 'size')
+_UPDATES = ('add', 'remove')
+
+
+class MovieServerError(Exception):
+    """ Raised by MovieClient when the server reports a failed request. """
+
+
+def _movie_fields(movie):
+    """ (Private) Return movie as a dict for JSON, or None. """
+    if movie is None:
+        return None
+    return {'title': movie._title, 'date': movie._date,
+            'runtime': movie._time}
+
+
+class MovieServer:
+    """ Serves one movie library to many connections.
+
+    Every library call is made on a single worker thread, so the library is
+    never used by two calls at once and the event loop never blocks on it
+    (a B-tree library may be reading its page file). Calls are handed to the
+    worker in batches: all the calls that arrive while a batch runs go
+    together in the next one.
+    """
+
+    def __init__(self, library, max_pending=DEFAULT_MAX_PENDING):
+        """ Initialise a MovieServer.
+
+        Args:
+            library - a MovieLib, or any object with the same methods (such
+                as a read-only CompactMovieLib)
+            max_pending - the most requests in progress per connection
+        """
+        self._library = library
+        self._max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = []
+        self._worker = None
+        self._inflight = {}
+        self._server = None
+        self._connections = set()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """ Start listening on the Unix socket path, or else on host:port.
+
+        Returns the asyncio server, whose sockets give the address.
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host, port, limit=LINE_LIMIT)
+        return self._server
+
+    async def serve_forever(self):
+        """ Serve until cancelled. """
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """ Stop listening, close every connection, and release the worker
+        thread.
+
+        Requests still in progress are abandoned, and their clients see the
+        connection close.
+        """
+        if self._server is not None:
+            self._server.close()
+        connections = list(self._connections)
+        for connection in connections:
+            connection.cancel()
+        if connections:
+            await asyncio.wait(connections)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._worker is not None:
+            # let the batch on the worker thread finish before shutting it
+            await asyncio.wait([self._worker])
+        self._executor.shutdown(wait=True)
+
+    def _run_batch(self, batch):
+        """ (Private) Make the library calls in batch, on the worker thread.
+
+        Returns a list of (ok, value) pairs, one per call.
+        """
+        results = []
+        for op, args, future in batch:
+            try:
+                value = getattr(self._library, op)(*args)
+                if op == 'prefix':
+                    value = [_movie_fields(movie) for movie in value]
+                elif op != 'size':
+                    value = _movie_fields(value)
+                results.append((True, value))
+            except Exception as error:
+                results.append((False, error))
+        return results
+
+    async def _drain_queue(self):
+        """ (Private) Hand queued calls to the worker until none are left. """
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            batch = self._queue
+            self._queue = []
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._run_batch, batch)
+            except asyncio.CancelledError:
+                for op, args, future in batch + self._queue:
+                    future.cancel()
+                self._queue = []
+                raise
+            except Exception as error:
+                # the batch never ran (say, the worker was shut down), so
+                # fail every call in it rather than leave them waiting
+                for op, args, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (op, args, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _call(self, op, args):
+        """ (Private) Queue a library call, and return a future of its result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((op, args, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._drain_queue())
+        return future
+
+    async def _lookup(self, op, args):
+        """ (Private) Return the result of a lookup, sharing in-flight calls.
+        """
+        key = (op, args)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._call(op, args)
+            self._inflight[key] = future
+
+            def forget(done):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+            future.add_done_callback(forget)
+        return await asyncio.shield(future)
+
+    async def _update(self, op, args):
+        """ (Private) Return the result of an add or remove. """
+        # lookups queued from now on must see this update, so they may not
+        # share a call queued before it
+        self._inflight.clear()
+        return await self._call(op, args)
+
+    async def _execute(self, request):
+        """ (Private) Return the result of the request dict. """
+        op = request.get('op')
+        if op == 'search':
+            return await self._lookup(op, (request['title'],))
+        if op == 'prefix':
+            return await self._lookup(op, (request['prefix'],
+                                           request.get('limit')))
+        if op == 'size':
+            return await self._lookup(op, ())
+        if op == 'add':
+            return await self._update(op, (request['title'], request['date'],
+                                           request['runtime']))
+        if op == 'remove':
+            return await self._update(op, (request['title'],))
+        raise ValueError('unknown op: ' + str(op))
+
+    async def _respond(self, line, writer, lock, pending):
+        """ (Private) Answer the request on line, then free its slot. """
+        try:
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get('id')
+                response = {'id': request_id,
+                            'result': await self._execute(request)}
+            except Exception as error:
+                response = {'id': request_id,
+                            'error': type(error).__name__ + ': ' + str(error)}
+            async with lock:
+                writer.write(json.dumps(response).encode('utf8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            pending.release()
+
+    async def _handle(self, reader, writer):
+        """ (Private) Serve one connection until the client closes it. """
+        pending = asyncio.Semaphore(self._max_pending)
+        lock = asyncio.Lock()
+        tasks = set()
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            while True:
+                # no more reading while this connection is at its limit
+                await pending.acquire()
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the line was longer than LINE_LIMIT
+                    break
+                if not line:
+                    break
+                task = asyncio.ensure_future(
+                    self._respond(line, writer, lock, pending))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, asyncio.CancelledError):
+            # cancelled by close(); this task is the connection's own, so
+            # the cancellation stops here
+            pass
+        finally:
+            # only left running if this connection is being cancelled
+            for task in tasks:
+                task.cancel()
+            self._connections.discard(connection)
+            writer.close()
+
+
+class MovieClient:
+    """ A client of a MovieServer.
+
+    Requests may be made concurrently from many tasks; they are pipelined
+    over the one connection.
+    """
+
+    def __init__(self, reader, writer):
+        """ Initialise a MovieClient on an open connection. """
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._waiting = {}
+        self._responses = asyncio.ensure_future(self._read_responses())
+
+    async def _read_responses(self):
+        """ (Private) Hand each response to the request waiting for it. """
+        error = ConnectionError('connection to the server closed')
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._waiting.pop(response['id'], None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(MovieServerError(response['error']))
+                else:
+                    future.set_result(response['result'])
+        except Exception as failure:
+            error = failure
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        self._waiting.clear()
+
+    async def _request(self, op, **fields):
+        """ (Private) Send a request and return its result. """
+        if self._responses.done():
+            raise ConnectionError('connection to the server closed')
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        fields['id'] = request_id
+        fields['op'] = op
+        self._writer.write(json.dumps(fields).encode('utf8') + b'\n')
+        await self._writer.drain()
+        return await future
+
+    def _movie(self, fields):
+        """ (Private) Return a Movie from a result dict, or None. """
+        if fields is None:
+            return None
+        return Movie(fields['title'], fields['date'], fields['runtime'])
+
+    async def search(self, title):
+        """ Return Movie with matching title if there, or None. """
+        return self._movie(await self._request('search', title=title))
+
+    async def prefix(self, prefix, limit=None):
+        """ Return a list of the Movies whose titles start with prefix. """
+        found = await self._request('prefix', prefix=prefix, limit=limit)
+        return [self._movie(fields) for fields in found]
+
+    async def size(self):
+        """ Return the number of movies in the library. """
+        return await self._request('size')
+
+    async def add(self, title, date, runtime):
+        """ Add a new movie to the library, and return it, or None. """
+        return self._movie(await self._request(
+            'add', title=title, date=date, runtime=runtime))
+
+    async def remove(self, title):
+        """ Remove and return the movie with the given title, if there. """
+        return self._movie(await self._request('remove', title=title))
+
+    async def close(self):
+        """ Close the connection. """
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._responses
+
+
+async def connect(path=None, host='127.0.0.1', port=None):
+    """ Return a MovieClient connected to the Unix socket path, or host:port.
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(
+            path, limit=LINE_LIMIT)
+    else:
+        reader, writer = await asyncio.open_connection(
+            host, port, limit=LINE_LIMIT)
+    return MovieClient(reader, writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a movie library.')
+    parser.add_argument('filename', help='tab-separated file of movies')
+    parser.add_argument('--unix', help='path of a Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--engine', default='bst', choices=('bst', 'btree'))
+    parser.add_argument('--collation', default='exact')
+    args = parser.parse_args()
+
+    async def serve():
+        library = build_library(args.filename, args.engine, args.collation)
+        server = MovieServer(library)
+        listening = await server.start(args.unix, args.host, args.port)
+        for sock in listening.sockets:
+            print('serving on', sock.getsockname())
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import random
+
+import pytest
+
+import bst
+from bst import BSTNode
+from movieLib import Movie, MovieLib
+from validate import check_tree
+
+
+def _tree(items):
+    """ Return the root of a BST of items, added in order. """
+    root = BSTNode(items[0])
+    for item in items[1:]:
+        root.add(item)
+    return root
+
+
+def _assert_tree(root, items):
+    """ Assert that root is a valid BST holding exactly items. """
+    assert check_tree(root).ok(), str(check_tree(root))
+    assert list(root.inorder()) == sorted(items)
+
+
+def test_search_returns_the_stored_element():
+    root = _tree([bst.TestClass('M', 'stored m'),
+                  bst.TestClass('C', 'stored c'),
+                  bst.TestClass('X', 'stored x')])
+    assert root.search(bst.TestClass('C')).full_str() == 'C: stored c'
+    assert root.search(bst.TestClass('X')).full_str() == 'X: stored x'
+    assert root.search(bst.TestClass('A')) is None
+
+
+@pytest.mark.parametrize('items', [[50, 30], [50, 70], [50, 30, 20, 40]])
+def test_remove_root_with_one_child(items):
+    root = _tree(items)
+    assert root.remove(50) == 50
+    # the root node stays the root, holding its child's contents
+    assert root._parent is None
+    _assert_tree(root, items[1:])
+
+
+def test_remove_root_with_two_children():
+    items = [50, 30, 70, 20, 40, 60, 80]
+    root = _tree(items)
+    assert root.remove(50) == 50
+    assert root._element == 40
+    _assert_tree(root, [item for item in items if item != 50])
+
+
+def test_remove_root_alone_leaves_it_to_the_caller():
+    root = _tree([50])
+    assert root.remove(50) == 50
+    assert root.leaf()
+    library = MovieLib()
+    library.add('Alien', '01/01/1979', 117)
+    assert library.remove('Alien').get_title() == 'Alien'
+    assert library.bst is None
+    assert library.search('Alien') is None
+    assert library.add('Alien', '01/01/1979', 117) is not None
+
+
+@pytest.mark.parametrize('removed', [50, 30])
+def test_remove_two_children_predecessor_has_left_child(removed):
+    # the predecessor of 50 is 40 and of 30 is 25; each has a left child
+    items = [50, 30, 70, 20, 40, 35, 25, 22, 60]
+    root = _tree(items)
+    assert root.remove(removed) == removed
+    _assert_tree(root, [item for item in items if item != removed])
+
+
+@pytest.mark.parametrize('removed', [20, 70, 22, 35])
+def test_remove_leaf_and_one_child_nodes(removed):
+    items = [50, 30, 70, 20, 40, 35, 25, 22, 80]
+    root = _tree(items)
+    node = root.search_node(removed)
+    assert root.remove(removed) == removed
+    assert node._parent is None
+    _assert_tree(root, [item for item in items if item != removed])
+
+
+def test_remove_missing_returns_none():
+    root = _tree([50, 30, 70])
+    assert root.remove(40) is None
+    _assert_tree(root, [30, 50, 70])
+
+
+def test_random_removes_match_model():
+    rng = random.Random(2)
+    items = rng.sample(range(1000), 200)
+    root = _tree(items)
+    model = set(items)
+    for item in rng.sample(items, 199):
+        assert root.remove(item) == item
+        model.discard(item)
+        _assert_tree(root, model)
+
+
+def test_fold_matches_case_and_accents():
+    for engine in ['bst', 'btree']:
+        library = MovieLib(engine, 'fold')
+        for title in ['Amélie', 'Alien', 'brazil']:
+            library.add(title, '01/01/2000', 90)
+        assert library.search('amelie').get_title() == 'Amélie'
+        assert library.search('AMÉLIE').get_title() == 'Amélie'
+        assert library.add('ALIEN', '01/01/2000', 90) is None
+        assert library.search('alien').get_title() == 'Alien'
+        assert library.size() == 3
+        # ordered by the folded titles, so case does not split them up
+        titles = [movie.get_title() for movie in library.movies()]
+        assert titles == ['Alien', 'Amélie', 'brazil']
+        assert library.remove('ameLIE').get_title() == 'Amélie'
+
+
+def test_exact_keeps_titles_distinct():
+    for engine in ['bst', 'btree']:
+        library = MovieLib(engine)
+        for title in ['Amélie', 'Alien', 'brazil', 'ALIEN']:
+            assert library.add(title, '01/01/2000', 90) is not None
+        assert library.search('amelie') is None
+        assert library.search('Alien').get_title() == 'Alien'
+        assert library.size() == 4
+        titles = [movie.get_title() for movie in library.movies()]
+        assert titles == ['ALIEN', 'Alien', 'Amélie', 'brazil']
+
+
+def test_movie_comparisons_follow_the_collation():
+    assert Movie('Amélie', collation='fold') == Movie('AMELIE',
+                                                       collation='fold')
+    assert Movie('Amélie') != Movie('AMELIE')
+    assert Movie('alien', collation='fold') < Movie('Brazil',
+                                                     collation='fold')
+    assert Movie('Brazil') < Movie('alien')
+    with pytest.raises(ValueError):
+        MovieLib(collation='Fold')
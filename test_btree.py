@@ -0,0 +1,212 @@
+import os
+import random
+
+import pytest
+
+from btree import BTree
+from movieLib import MovieLib
+
+
+def _check(tree):
+    """ Assert the B-tree invariants of tree: ordered keys, node fill, and
+    every leaf at the same depth.
+    """
+    store = tree._store
+    depths = set()
+
+    def check_node(ref, low, high, depth, root):
+        node = store.load(ref)
+        assert node._keys == sorted(node._keys)
+        assert len(node._items) < tree._order
+        if not root:
+            assert len(node._items) >= tree._minitems
+        for key in node._keys:
+            assert low is None or low < key
+            assert high is None or key < high
+        if node._children:
+            assert len(node._children) == len(node._items) + 1
+            bounds = [low] + node._keys + [high]
+            for i, child in enumerate(node._children):
+                check_node(child, bounds[i], bounds[i + 1], depth + 1, False)
+        else:
+            depths.add(depth)
+
+    check_node(store.root, None, None, 0, True)
+    assert len(depths) <= 1
+
+
+def _run_model(tree, seed, steps=3000, keys=500):
+    """ Apply random adds and removes to tree and to a set, checking that
+    they agree, and return the set.
+    """
+    model = set()
+    rng = random.Random(seed)
+    for step in range(steps):
+        key = rng.randrange(keys)
+        if rng.random() < 0.55:
+            added = tree.add(key)
+            assert (added is not None) == (key not in model)
+            model.add(key)
+        else:
+            removed = tree.remove(key)
+            assert removed == (key if key in model else None)
+            model.discard(key)
+        assert tree.size() == len(model)
+        if step % 101 == 0:
+            _check(tree)
+    return model
+
+
+@pytest.mark.parametrize('order', [3, 4, 5, 8, 33])
+def test_matches_set_in_memory(order):
+    tree = BTree(order=order)
+    model = _run_model(tree, order)
+    _check(tree)
+    assert list(tree) == sorted(model)
+    assert all(tree.search(key) == key for key in model)
+    assert tree.search(-1) is None
+
+
+@pytest.mark.parametrize('order', [3, 8, 33])
+def test_matches_set_in_page_file_and_reopens(tmp_path, order):
+    pagefile = str(tmp_path / 'tree.pages')
+    tree = BTree(order=order, pagefile=pagefile, page_size=4096,
+                 cache_pages=8)
+    model = _run_model(tree, order)
+    tree.close()
+
+    # the order and page size come from the file
+    with BTree(pagefile=pagefile) as tree:
+        _check(tree)
+        assert list(tree) == sorted(model)
+        assert tree.size() == len(model)
+        # keep going after reopening
+        for key in range(-50, 0):
+            tree.add(key)
+            model.add(key)
+    with BTree(pagefile=pagefile) as tree:
+        assert list(tree) == sorted(model)
+
+
+def test_page_file_cut_short_is_rejected(tmp_path):
+    pagefile = str(tmp_path / 'tree.pages')
+    tree = BTree(order=4, pagefile=pagefile, cache_pages=8)
+    for key in range(100):
+        tree.add(key)
+    tree.flush()
+    # enough changes that some pages are written back, but no flush
+    for key in range(100, 200):
+        tree.add(key)
+    with pytest.raises(ValueError):
+        BTree(pagefile=pagefile)
+    tree.close()
+    with BTree(pagefile=pagefile) as tree:
+        assert list(tree) == list(range(200))
+
+
+def test_page_file_left_open_after_flush_reopens(tmp_path):
+    pagefile = str(tmp_path / 'tree.pages')
+    tree = BTree(order=4, pagefile=pagefile, cache_pages=8)
+    for key in range(100):
+        tree.add(key)
+    tree.flush()
+    with BTree(pagefile=pagefile) as other:
+        assert list(other) == list(range(100))
+    # a session that only reads writes nothing, so it can be abandoned
+    reader = BTree(pagefile=pagefile, cache_pages=8)
+    assert reader.search(50) == 50
+    assert list(reader) == list(range(100))
+    with BTree(pagefile=pagefile) as other:
+        assert other.size() == 100
+
+
+@pytest.mark.parametrize('bad', [{'collation': 'Fold'},
+                                 {'compact_ratio': 0},
+                                 {'sample_rate': 2},
+                                 {'validation': 'path'}])
+def test_bad_library_arguments_leave_page_file_usable(tmp_path, bad):
+    pagefile = str(tmp_path / 'lib.pages')
+    with MovieLib('btree', pagefile=pagefile) as library:
+        library.add('Brazil', '01/01/1985', 132)
+    with pytest.raises(ValueError):
+        MovieLib('btree', pagefile=pagefile, **bad)
+    with MovieLib('btree', pagefile=pagefile) as library:
+        assert library.search('Brazil') is not None
+
+
+def test_not_a_page_file_is_rejected(tmp_path):
+    pagefile = tmp_path / 'junk.pages'
+    pagefile.write_bytes(b'not a B-tree at all')
+    with pytest.raises(ValueError):
+        BTree(pagefile=str(pagefile))
+
+
+def test_nodes_too_big_for_a_page_overflow(tmp_path):
+    pagefile = str(tmp_path / 'tree.pages')
+    rng = random.Random(4)
+    model = set()
+    with BTree(order=4, pagefile=pagefile, page_size=256,
+               cache_pages=8) as tree:
+        for step in range(600):
+            # mostly short items, some spanning several pages
+            item = '%03d' % rng.randrange(200)
+            if rng.random() < 0.2:
+                item += 'x' * rng.randrange(200, 1500)
+            if item in model:
+                assert tree.remove(item) == item
+                model.discard(item)
+            else:
+                assert tree.add(item) == item
+                model.add(item)
+        _check(tree)
+    with BTree(pagefile=pagefile) as tree:
+        assert list(tree) == sorted(model)
+        for item in sorted(model):
+            tree.remove(item)
+        assert tree.size() == 0
+        size = os.path.getsize(pagefile)
+        # every page freed is reused
+        for item in sorted(model):
+            tree.add(item)
+    assert os.path.getsize(pagefile) <= size
+    with BTree(pagefile=pagefile) as tree:
+        assert list(tree) == sorted(model)
+
+
+@pytest.mark.parametrize('engine', ['bst', 'btree'])
+def test_prefix_matches_model(tmp_path, engine):
+    options = {}
+    if engine == 'btree':
+        options = {'order': 4, 'pagefile': str(tmp_path / 'lib.pages'),
+                   'page_size': 4096, 'cache_pages': 8}
+    rng = random.Random(7)
+    titles = {''.join(rng.choice('abc') for i in range(rng.randint(1, 5)))
+              for i in range(300)}
+    with MovieLib(engine, **options) as library:
+        for title in titles:
+            library.add(title, '01/01/2000', 90)
+        for title in list(titles)[::3]:
+            library.remove(title)
+            titles.discard(title)
+        for prefix in ['', 'a', 'ab', 'cab', 'ccccc', 'd']:
+            expected = sorted(t for t in titles if t.startswith(prefix))
+            found = library.prefix(prefix)
+            assert [movie.get_title() for movie in found] == expected
+            limited = library.prefix(prefix, 3)
+            assert [movie.get_title() for movie in limited] == expected[:3]
+
+
+def test_page_file_keeps_its_collation(tmp_path):
+    pagefile = str(tmp_path / 'lib.pages')
+    with MovieLib('btree', 'fold', pagefile=pagefile) as library:
+        for title in ['Brazil', 'Alien', 'Amélie', 'Memento']:
+            library.add(title, '01/01/2000', 90)
+    with pytest.raises(ValueError):
+        MovieLib('btree', pagefile=pagefile)
+    with pytest.raises(ValueError):
+        BTree(pagefile=pagefile)
+    with MovieLib('btree', 'fold', pagefile=pagefile) as library:
+        assert library.search('Brazil') is not None
+        assert library.search('AMELIE').get_title() == 'Amélie'
+        assert library.add('BRAZIL', '01/01/2000', 90) is None
+        assert library.size() == 4
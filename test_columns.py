@@ -0,0 +1,69 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from columns import MovieColumns
+from movieLib import Movie, MovieLib
+
+
+@pytest.mark.parametrize('date, expected', [
+    ('25/12/1999', '1999-12-25'),
+    (' 1/2/2003\n', '2003-02-01'),
+    (None, 'NaT'),
+    ('', 'NaT'),
+    ('1999', 'NaT'),
+    ('12/1999', 'NaT'),
+    ('aa/bb/cccc', 'NaT'),
+    ('31/13/2000', 'NaT'),
+    ('30/02/2000', 'NaT'),
+    ('1/1/1/2000', 'NaT'),
+])
+def test_dates_parse_or_are_nat(date, expected):
+    columns = MovieColumns.from_movies([Movie('A', date, 90)])
+    assert str(columns.dates[0]) == expected
+
+
+@pytest.mark.parametrize('runtime, expected', [
+    (90, 90), ('113', 113), ('113\n', 113), (' 7 ', 7),
+    (None, -1), ('', -1), ('1h 30m', -1), ('90.5', -1)])
+def test_runtimes_parse_or_are_minus_one(runtime, expected):
+    columns = MovieColumns.from_movies([Movie('A', '01/01/2000', runtime)])
+    assert columns.runtimes[0] == expected
+
+
+def test_missing_values_are_left_out_of_analytics():
+    movies = [Movie('A', '01/01/1990', 100), Movie('B', '01/06/1995', None),
+              Movie('C', None, 80), Movie('D', '01/01/2001', 'x'),
+              Movie('E', '31/12/1999', 120)]
+    columns = MovieColumns.from_movies(movies)
+    assert list(columns.years()) == [1990, 1995, -1, 2001, 1999]
+    stats = columns.stats()
+    assert stats['count'] == 3
+    assert stats['mean'] == 100.0
+    assert (stats['min'], stats['max']) == (80, 120)
+    counts, edges = columns.histogram(bins=2, range=(80, 120))
+    assert list(counts) == [1, 2]
+
+    starts, counts, means = columns.groupby_year(10)
+    assert list(starts) == [1990, 2000]
+    assert list(counts) == [3, 1]
+    assert means[0] == 110.0
+    assert np.isnan(means[1])
+
+
+def test_no_runtimes_or_dates():
+    columns = MovieColumns.from_movies([Movie('A'), Movie('B')])
+    assert columns.stats()['count'] == 0
+    assert columns.stats()['mean'] is None
+    starts, counts, means = columns.groupby_year()
+    assert len(starts) == len(counts) == len(means) == 0
+
+
+def test_titles_round_trip_in_title_order():
+    library = MovieLib()
+    for title in ['Zoë', 'Amélie', 'Memento', '']:
+        library.add(title, '01/01/2000', 90)
+    columns = library.to_columns()
+    assert len(columns) == 4
+    assert [columns.title(i) for i in range(4)] == ['', 'Amélie',
+                                                   'Memento', 'Zoë']
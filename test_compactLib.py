@@ -0,0 +1,121 @@
+from bisect import bisect_left
+
+import pytest
+
+from compactLib import CompactMovieLib, FrontCodedList
+from movieLib import MovieLib
+
+
+def _strings(count):
+    """ Return count sorted strings sharing long prefixes, some non-ASCII. """
+    return sorted('the movie ' + 'é' * (i % 3) + '%04d' % i
+                  for i in range(count))
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 4, 16])
+@pytest.mark.parametrize('count', [0, 1, 4, 5, 17, 48])
+def test_index_and_lower_bound_at_block_boundaries(block_size, count):
+    strings = _strings(count)
+    coded = FrontCodedList(strings, block_size)
+    assert len(coded) == count
+    assert list(coded) == strings
+    for i, string in enumerate(strings):
+        # every position, which covers each block's head and tail
+        assert coded[i] == string
+        assert coded.index(string) == i
+        assert coded.lower_bound(string) == i
+        assert list(coded.iter_from(i)) == strings[i:]
+        # between this string and the next, and just before this one
+        for probe in [string + '\0', string[:-1]]:
+            assert coded.index(probe) == (strings.index(probe)
+                                          if probe in strings else -1)
+            assert coded.lower_bound(probe) == bisect_left(strings, probe)
+    for probe in ['', 'a', 'the movie', 'zzz']:
+        assert coded.index(probe) == -1
+        assert coded.lower_bound(probe) == bisect_left(strings, probe)
+    assert list(coded.iter_from(count)) == []
+
+
+def test_getitem_out_of_range():
+    coded = FrontCodedList(['a', 'b', 'c'], 2)
+    assert coded[-1] == 'c'
+    with pytest.raises(IndexError):
+        coded[3]
+    with pytest.raises(IndexError):
+        coded[-4]
+
+
+def test_block_size_must_be_positive():
+    with pytest.raises(ValueError):
+        FrontCodedList(['a'], 0)
+
+
+def _library(collation):
+    """ Return a MovieLib with varied dates and runtimes. """
+    library = MovieLib(collation=collation)
+    for i, title in enumerate(_strings(100) + ['Amélie', 'AMELIE 2']):
+        date = None if i % 7 == 0 else '%d/%d/19%02d' % (i % 28 + 1,
+                                                          i % 12 + 1, i % 100)
+        runtime = [90, '91\n', None, -3][i % 4]
+        library.add(title, date, runtime)
+    return library
+
+
+def _rows(library):
+    """ Return (title, date, runtime) for every movie in library. """
+    return [(movie._title, movie._date, movie._time)
+            for movie in library.movies()]
+
+
+@pytest.mark.parametrize('collation', ['exact', 'fold'])
+def test_matches_library(collation):
+    library = _library(collation)
+    compact = library.freeze(block_size=4)
+    assert _rows(compact) == _rows(library)
+    assert str(compact) == str(library)
+    assert compact.size() == library.size()
+    for title in ['the movie 0007', 'THE MOVIE 0007', 'amelie', 'nope', '']:
+        expected = library.search(title)
+        found = compact.search(title)
+        assert (found is None) == (expected is None)
+        if found is not None:
+            assert found.full_str() == expected.full_str()
+    for prefix in ['the movie é', 'AM', 'x']:
+        assert ([m.full_str() for m in compact.prefix(prefix, 5)]
+                == [m.full_str() for m in library.prefix(prefix, 5)])
+    with pytest.raises(TypeError):
+        compact.add('x', None, None)
+
+
+@pytest.mark.parametrize('collation', ['exact', 'fold'])
+def test_snapshot_round_trip(tmp_path, collation):
+    compact = _library(collation).freeze(block_size=3)
+    filename = str(tmp_path / 'library.snapshot')
+    compact.save(filename)
+    loaded = CompactMovieLib.load(filename)
+    assert _rows(loaded) == _rows(compact)
+    for title in ['amelie', 'Amélie', 'the movie 0042', 'nope']:
+        found = loaded.search(title)
+        expected = compact.search(title)
+        assert (found and found.full_str()) == (expected and
+                                                expected.full_str())
+
+
+def test_empty_snapshot_round_trip(tmp_path):
+    filename = str(tmp_path / 'library.snapshot')
+    MovieLib().freeze().save(filename)
+    assert CompactMovieLib.load(filename).size() == 0
+
+
+def test_bad_snapshots_are_rejected(tmp_path):
+    filename = str(tmp_path / 'library.snapshot')
+    _library('exact').freeze().save(filename)
+    with open(filename, 'rb') as file:
+        data = file.read()
+    bad = [b'', data[:10], data[:-1], data + b'\0', b'X' + data[1:],
+           data[:8] + b'\x63' + data[9:]]
+    for contents in bad:
+        with open(filename, 'wb') as file:
+            file.write(contents)
+        with pytest.raises(ValueError):
+            CompactMovieLib.load(filename)
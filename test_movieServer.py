@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+import pytest
+
+from movieLib import MovieLib
+from movieServer import MovieServer, MovieServerError, connect
+
+
+class GatedLib(MovieLib):
+    """ A MovieLib that counts its lookups, and whose lookups wait for a
+    gate to open so that requests can be made to pile up.
+    """
+
+    def __init__(self):
+        MovieLib.__init__(self)
+        self.gate = threading.Event()
+        self.calls = []
+
+    def search(self, title):
+        self.gate.wait()
+        self.calls.append(('search', title))
+        return MovieLib.search(self, title)
+
+    def size(self):
+        self.gate.wait()
+        self.calls.append(('size',))
+        return MovieLib.size(self)
+
+
+def _serve(tmp_path, test, library=None):
+    """ Run test(server, library, path) against a server on a Unix socket.
+    """
+    if library is None:
+        library = GatedLib()
+        library.gate.set()
+    for title in ['Alien', 'Aliens', 'Memento']:
+        library.add(title, '01/01/2000', 100)
+    path = str(tmp_path / 'server.sock')
+
+    async def run():
+        server = MovieServer(library)
+        await server.start(path)
+        try:
+            await asyncio.wait_for(test(server, library, path), 10)
+        finally:
+            library.gate.set()
+            await asyncio.wait_for(server.close(), 10)
+
+    asyncio.run(run())
+
+
+async def _until(condition):
+    """ Wait for condition() to hold. """
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_requests(tmp_path):
+    async def test(server, library, path):
+        client = await connect(path)
+        assert (await client.search('Memento')).full_str() == \
+            'Memento: 01/01/2000; 100'
+        assert await client.search('Nope') is None
+        assert await client.size() == 3
+        found = await client.prefix('Alien')
+        assert [movie.get_title() for movie in found] == ['Alien', 'Aliens']
+        assert len(await client.prefix('Alien', 1)) == 1
+        with pytest.raises(MovieServerError):
+            await client._request('bogus')
+        await client.close()
+
+    _serve(tmp_path, test)
+
+
+def test_identical_lookups_share_one_call(tmp_path):
+    library = GatedLib()
+
+    async def test(server, library, path):
+        clients = [await connect(path) for i in range(4)]
+        # hold the worker on one call while the lookups queue up
+        blocker = asyncio.ensure_future(clients[0].size())
+        await _until(lambda: server._worker is not None)
+        lookups = [asyncio.ensure_future(client.search('Alien'))
+                   for client in clients for i in range(10)]
+        await _until(lambda: ('search', ('Alien',)) in server._inflight)
+        await asyncio.sleep(0.1)
+        library.gate.set()
+        results = await asyncio.gather(*lookups)
+        assert all(movie.get_title() == 'Alien' for movie in results)
+        assert await blocker == 3
+        assert library.calls.count(('search', 'Alien')) == 1
+        for client in clients:
+            await client.close()
+
+    _serve(tmp_path, test, library)
+
+
+def test_lookups_after_an_update_see_it(tmp_path):
+    library = GatedLib()
+
+    async def test(server, library, path):
+        client = await connect(path)
+        blocker = asyncio.ensure_future(client.size())
+        await _until(lambda: server._worker is not None)
+        # all queued together, behind the blocker, in this order
+        requests = [client.search('Alien'), client.remove('Alien'),
+                    client.search('Alien'), client.add('Alien', 'd', 1),
+                    client.search('Alien'), client.size()]
+        pending = [asyncio.ensure_future(request) for request in requests]
+        await asyncio.sleep(0.1)
+        library.gate.set()
+        before, removed, after, added, again, size = \
+            await asyncio.gather(*pending)
+        assert before.full_str() == 'Alien: 01/01/2000; 100'
+        assert removed.get_title() == 'Alien'
+        assert after is None
+        assert added.full_str() == 'Alien: d; 1'
+        assert again.full_str() == 'Alien: d; 1'
+        assert size == 3
+        await blocker
+        await client.close()
+
+    _serve(tmp_path, test, library)
+
+
+def test_close_ends_live_connections(tmp_path):
+    library = GatedLib()
+
+    async def test(server, library, path):
+        busy = await connect(path)
+        idle = await connect(path)
+        # a request still on the worker thread when the server closes
+        stuck = asyncio.ensure_future(busy.search('Alien'))
+        await _until(lambda: server._worker is not None)
+        closing = asyncio.ensure_future(server.close())
+        await asyncio.sleep(0.1)
+        library.gate.set()
+        await asyncio.wait_for(closing, 5)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(stuck, 5)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(idle.size(), 5)
+        await busy.close()
+        await idle.close()
+        with pytest.raises(OSError):
+            await connect(path)
+
+    _serve(tmp_path, test, library)
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from movieLib import MovieLib
+
+
+def _library(count, compact_ratio):
+    """ Return a tombstone library holding count titles, and the titles. """
+    library = MovieLib(tombstones=True, compact_ratio=compact_ratio,
+                       validation='full')
+    titles = ['t%02d' % i for i in range(count)]
+    for title in titles:
+        library.add(title, '01/01/2000', 90)
+    return library, titles
+
+
+@pytest.mark.parametrize('count, compact_ratio, threshold', [
+    (10, 0.5, 6), (10, 0.3, 4), (9, 0.5, 5), (8, 0.25, 3), (10, 1.0, 10)])
+def test_compacts_once_past_the_ratio(count, compact_ratio, threshold):
+    library, titles = _library(count, compact_ratio)
+    for removed, title in enumerate(titles, 1):
+        tree = library.bst
+        assert library.remove(title).get_title() == title
+        if removed == threshold:
+            # rebuilt from the movies that remain, with no tombstones
+            assert library.bst is not tree
+            assert library._dead == 0
+            assert library._nodes == count - removed
+            assert library.validate().ok()
+            break
+        assert library.size() == count - removed
+        assert library.bst is tree
+        assert library._dead == removed
+        assert library._nodes == count
+
+
+def test_removing_a_tombstone_again_finds_nothing():
+    library, titles = _library(10, 0.5)
+    library.remove('t03')
+    assert library.remove('t03') is None
+    assert library.search('t03') is None
+    assert library._dead == 1
+
+
+def test_add_revives_tombstone_without_new_node():
+    library, titles = _library(10, 0.5)
+    library.remove('t04')
+    library.remove('t05')
+    movie = library.add('t04', '02/02/2002', 100)
+    assert movie is not None
+    assert library.search('t04').full_str() == 't04: 02/02/2002; 100'
+    assert library._nodes == 10
+    assert library._dead == 1
+    assert library.add('t04', '03/03/2003', 110) is None
+    # revived nodes count as live again when deciding to compact
+    tree = library.bst
+    for title in ['t06', 't07', 't08', 't09']:
+        library.remove(title)
+    assert library.bst is tree
+    library.remove('t00')
+    assert library.bst is not tree
+    assert library._nodes == 4
+
+
+def test_matches_model_with_compactions():
+    rng = random.Random(3)
+    library = MovieLib(tombstones=True, compact_ratio=0.3)
+    model = set()
+    for step in range(2000):
+        title = 't%03d' % rng.randrange(200)
+        if rng.random() < 0.5:
+            added = library.add(title, '01/01/2000', 90)
+            assert (added is not None) == (title not in model)
+            model.add(title)
+        else:
+            removed = library.remove(title)
+            assert (removed is not None) == (title in model)
+            model.discard(title)
+        assert library._dead <= 0.3 * library._nodes
+        assert [m.get_title() for m in library.movies()] == sorted(model)
+    assert library.validate().ok()
+
+
+@pytest.mark.parametrize('tombstones', [False, True])
+def test_emptied_library_is_empty_either_way(tombstones):
+    library = MovieLib(tombstones=tombstones, compact_ratio=1.0)
+    for title in ['a', 'b', 'c']:
+        library.add(title, '01/01/2000', 90)
+    for title in ['b', 'a', 'c']:
+        library.remove(title)
+    assert library.bst is None
+    assert library.size() is None
+    assert library.__str__() == MovieLib().__str__()
+    assert library.add('a', '01/01/2000', 90) is not None
+    assert library.size() == 1
+
+
+def test_size_does_not_walk_the_tree():
+    # sorted adds make a tree as deep as it is long
+    library = MovieLib(tombstones=True)
+    count = 3000
+    for i in range(count):
+        library.add('t%05d' % i, '01/01/2000', 90)
+    library.remove('t00000')
+    assert library.size() == count - 1
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from movieLib import MovieLib
+from validate import InvariantError, check_path, check_tree
+
+
+def _library(**options):
+    """ Return a BST library of single-letter titles, root M. """
+    library = MovieLib(**options)
+    for title in 'MFTBHPX':
+        library.add(title, '01/01/2000', 90)
+    return library
+
+
+def _node(library, title):
+    """ Return the BSTNode holding title. """
+    return library.bst.search_node(library.search(title))
+
+
+def _kinds(report):
+    """ Return the kinds of violation in report. """
+    return [violation.kind for violation in report.violations]
+
+
+@pytest.mark.parametrize('validation', ['path', 'full'])
+@pytest.mark.parametrize('tombstones', [False, True])
+def test_random_updates_stay_valid(validation, tombstones):
+    rng = random.Random(1)
+    library = MovieLib(tombstones=tombstones, validation=validation)
+    for step in range(1500):
+        title = 't%03d' % rng.randrange(150)
+        if rng.random() < 0.55:
+            library.add(title, '01/01/2000', 90)
+        else:
+            library.remove(title)
+    report = library.validate()
+    assert report.ok(), str(report)
+    assert report.size == library.size()
+    assert report.height == library.bst.height()
+
+
+def test_empty_tree():
+    report = check_tree(None)
+    assert report.ok()
+    assert report.size == 0
+    assert report.height == -1
+    assert check_path(None, 'x').ok()
+
+
+def test_broken_parent_link():
+    library = _library()
+    _node(library, 'H')._parent = library.bst
+    # seen from H's parent, and from the node H claims as its parent
+    assert _kinds(check_tree(library.bst)) == ['link', 'link']
+    assert _kinds(check_path(library.bst, 'H')) == ['link', 'link']
+    # off the path to P, so a path check does not see it
+    assert check_path(library.bst, 'P').ok()
+
+
+def test_key_out_of_order():
+    library = _library()
+    _node(library, 'H')._key = 'Z'
+    assert 'order' in _kinds(check_tree(library.bst))
+    assert 'order' in _kinds(check_path(library.bst, 'H'))
+
+
+def test_cycle_is_reported_not_followed():
+    library = _library()
+    _node(library, 'B')._leftchild = library.bst
+    assert 'cycle' in _kinds(check_tree(library.bst))
+
+
+def test_counts():
+    library = _library(tombstones=True)
+    library.remove('B')
+    assert check_tree(library.bst, 7, 1).ok()
+    assert _kinds(check_tree(library.bst, 8, 1)) == ['count']
+    assert _kinds(check_tree(library.bst, 7, 0)) == ['count']
+    assert library.validate().size == 6
+
+
+def test_violation_raises_or_is_passed_on():
+    library = _library(validation='path')
+    _node(library, 'F')._parent = None
+    with pytest.raises(InvariantError) as raised:
+        library.add('C', '01/01/2000', 90)
+    assert not raised.value.report.ok()
+
+    reports = []
+    library = _library(validation='full', on_violation=reports.append)
+    _node(library, 'F')._parent = None
+    library.add('Y', '01/01/2000', 90)
+    assert len(reports) == 1
+    assert _kinds(reports[0]) == ['link']
+
+
+def test_sample_rate_zero_checks_nothing():
+    reports = []
+    library = _library(validation='full', sample_rate=0,
+                       on_violation=reports.append)
+    _node(library, 'F')._parent = None
+    for title in 'ACDEGIJ':
+        library.add(title, '01/01/2000', 90)
+    assert reports == []
@@ -0,0 +1,197 @@
+""" Invariant checks for binary search trees of BSTNodes.
+
+check_tree() checks a whole tree in a single O(n) pass: parent and child
+links, the BST ordering of sort keys, and the node and tombstone counts.
+check_path() checks only the nodes an add or remove of one key can have
+changed, in O(height). Both return a ValidationReport rather than printing.
+"""
+
+
+class Violation:
+    """ One broken invariant found by a check.
+
+    kind is one of 'link' (a parent or child reference does not match),
+    'order' (a key is out of place), 'cycle' (a node is reachable twice) or
+    'count' (the tree does not hold the expected number of nodes).
+    """
+
+    def __init__(self, kind, node, message):
+        """ Initialise a Violation of the given kind, at node (or None). """
+        self.kind = kind
+        self.node = node
+        self.message = message
+
+    def __str__(self):
+        """ Return a one-line description of this violation. """
+        outstr = self.kind + ': ' + self.message
+        if self.node is not None:
+            outstr = outstr + ' (at ' + str(self.node._element) + ')'
+        return outstr
+
+
+class ValidationReport:
+    """ The outcome of a check.
+
+    Holds the violations found, the number of nodes checked and, for a full
+    check, the number of live elements (size) and the height of the tree.
+    """
+
+    def __init__(self):
+        """ Initialise an empty report. """
+        self.violations = []
+        self.nodes_checked = 0
+        self.size = None
+        self.height = None
+
+    def ok(self):
+        """ Return True if no violations were found. """
+        return not self.violations
+
+    def add(self, kind, node, message):
+        """ Record a violation. """
+        self.violations.append(Violation(kind, node, message))
+
+    def __str__(self):
+        """ Return a summary of the report, one violation per line. """
+        outstr = ('checked ' + str(self.nodes_checked) + ' nodes: '
+                  + str(len(self.violations)) + ' violations')
+        for violation in self.violations:
+            outstr = outstr + '\n  ' + str(violation)
+        return outstr
+
+
+class InvariantError(Exception):
+    """ Raised when a check finds a broken tree; carries the report. """
+
+    def __init__(self, report):
+        """ Initialise an InvariantError from a failed ValidationReport. """
+        super().__init__(str(report))
+        self.report = report
+
+
+def _check_node(node, low, high, report):
+    """ (Private) Check node against its key bounds and its neighbours.
+
+    low and high are the keys node's key must lie strictly between, or None
+    where there is no bound.
+    """
+    report.nodes_checked += 1
+    key = node._key
+    if low is not None and not low < key:
+        report.add('order', node, 'key is not after its lower bound')
+    if high is not None and not key < high:
+        report.add('order', node, 'key is not before its upper bound')
+    parent = node._parent
+    if (parent is not None and parent._leftchild is not node
+            and parent._rightchild is not node):
+        report.add('link', node, 'parent does not link back to the node')
+    left = node._leftchild
+    right = node._rightchild
+    if left is not None:
+        if left._parent is not node:
+            report.add('link', left, 'left child has the wrong parent')
+        if not left._key < key:
+            report.add('order', left, 'left child is not before its parent')
+    if right is not None:
+        if right._parent is not node:
+            report.add('link', right, 'right child has the wrong parent')
+        if not key < right._key:
+            report.add('order', right, 'right child is not after its parent')
+
+
+def check_tree(root, expected_nodes=None, expected_dead=None):
+    """ Check every invariant of the tree rooted at root, in one pass.
+
+    Args:
+        root - the root BSTNode, or None for an empty tree
+        expected_nodes - the number of nodes (tombstones included) the tree
+            should hold, or None not to check it
+        expected_dead - the number of tombstones it should hold, or None
+
+    Returns:
+        a ValidationReport, with size and height filled in
+    """
+    report = ValidationReport()
+    nodes = 0
+    dead = 0
+    height = -1
+    seen = set()
+    stack = []
+    if root is not None:
+        stack.append((root, None, None, 0))
+    while stack:
+        node, low, high, depth = stack.pop()
+        if id(node) in seen:
+            report.add('cycle', node, 'node is reachable more than once')
+            continue
+        seen.add(id(node))
+        _check_node(node, low, high, report)
+        nodes += 1
+        if node._dead:
+            dead += 1
+        if depth > height:
+            height = depth
+        if node._rightchild is not None:
+            stack.append((node._rightchild, node._key, high, depth + 1))
+        if node._leftchild is not None:
+            stack.append((node._leftchild, low, node._key, depth + 1))
+    report.size = nodes - dead
+    report.height = height
+    if expected_nodes is not None and nodes != expected_nodes:
+        report.add('count', None, 'found ' + str(nodes) + ' nodes, expected '
+                   + str(expected_nodes))
+    if expected_dead is not None and dead != expected_dead:
+        report.add('count', None, 'found ' + str(dead) + ' tombstones, '
+                   + 'expected ' + str(expected_dead))
+    return report
+
+
+def check_path(root, key):
+    """ Check the part of the tree that adding or removing key can change.
+
+    Checks each node on the search path for key, with its links and its
+    children. When key is not in the tree (it has just been removed), also
+    checks the right spine of the left subtree of key's predecessor on the
+    path, where removing a node with two children relinks the tree.
+
+    Args:
+        root - the root BSTNode, or None for an empty tree
+        key - the sort key that was added or removed
+
+    Returns:
+        a ValidationReport
+    """
+    report = ValidationReport()
+    seen = set()
+    low = None
+    high = None
+    predecessor = None
+    node = root
+    while node is not None:
+        if id(node) in seen:
+            report.add('cycle', node, 'search path loops back on itself')
+            return report
+        seen.add(id(node))
+        _check_node(node, low, high, report)
+        if key < node._key:
+            high = node._key
+            node = node._leftchild
+        elif node._key < key:
+            predecessor = (node, low)
+            low = node._key
+            node = node._rightchild
+        else:
+            return report
+    if predecessor is not None:
+        node, low = predecessor
+        high = node._key
+        node = node._leftchild
+        while node is not None:
+            if id(node) in seen:
+                report.add('cycle', node, 'right spine loops back on itself')
+                break
+            seen.add(id(node))
+            _check_node(node, low, high, report)
+            low = node._key
+            node = node._rightchild
+    return report